@@ -17,10 +17,422 @@
 # An up to date version can be found at:
 # https://github.com/Tomha/python-gtk-app-chooser
 
-import re
+import bisect
+import collections
+import itertools
+import threading
+import time
+import weakref
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gio, GObject, Gtk, Pango
+from gi.repository import Gdk, Gio, GLib, GObject, Gtk, Pango
+
+from AppQuery import AppCatalog, AppUsage, normalize_text
+
+
+class _Timings:
+    """Running statistics of the time taken by each phase of a widget's work.
+
+    Percentiles are taken over the most recent durations of each phase.
+    """
+
+    _WINDOW = 1000
+
+    def __init__(self):
+        self._durations = {}
+        self._counts = {}
+
+    def get_stats(self):
+        """Get statistics for every phase recorded so far.
+
+        :return: Dictionary mapping phase names to dictionaries holding the
+                 number of times the phase ran, and the median and 95th
+                 percentile of its recent durations in milliseconds.
+        """
+        stats = {}
+        for phase, durations in self._durations.items():
+            ordered = sorted(durations)
+            stats[phase] = {
+                "count": self._counts[phase],
+                "p50_ms": ordered[(len(ordered) - 1) // 2],
+                "p95_ms": ordered[int(0.95 * (len(ordered) - 1))],
+            }
+        return stats
+
+    def record(self, widget, phase, duration, count):
+        """Record the duration of a phase and emit the widget's timing signal.
+
+        :param widget: Widget which performed the phase.
+        :param phase: Name of the phase, one of "load", "index", "filter" or
+                      "render".
+        :param duration: Time taken in milliseconds.
+        :param count: Number of apps or rows processed.
+        :return: None
+        """
+        if phase not in self._durations:
+            self._durations[phase] = collections.deque(maxlen=self._WINDOW)
+            self._counts[phase] = 0
+        self._durations[phase].append(duration)
+        self._counts[phase] += 1
+        widget.emit("timing", phase, duration, count)
+
+    def record_catalog_load(self, widget, catalog):
+        """Record the load and index phases of the catalog's current apps.
+
+        :param widget: Widget which caused the catalog to load.
+        :param catalog: AppCatalog which was loaded.
+        :return: None
+        """
+        load_ms, index_ms = catalog.get_load_timings()
+        app_count = len(catalog.get_display_names())
+        self.record(widget, "load", load_ms, app_count)
+        self.record(widget, "index", index_ms, app_count)
+
+
+class _IconCache:
+    """Bounded cache of app icons loaded from the default icon theme.
+
+    Icons are kept in least recently used order, keyed by icon string, size
+    and scale factor, and are dropped whenever the icon theme changes.
+    """
+
+    _MAX_ICONS = 512
+
+    _default = None
+
+    def __init__(self):
+        self._pixbufs = collections.OrderedDict()
+        self._icon_theme = Gtk.IconTheme.get_default()
+        self._icon_theme.connect("changed", self._on_theme_changed)
+
+    @classmethod
+    def get_default(cls):
+        """Get the icon cache shared by all widgets in this process.
+
+        :return: The default _IconCache.
+        """
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def _load_pixbuf(self, icon_name, size, scale):
+        """Load an icon from the icon theme, falling back to a missing icon.
+
+        :param icon_name: String form of a Gio.Icon, usually a themed name.
+        :param size: Icon size in logical pixels.
+        :param scale: Scale factor of the widget showing the icon.
+        :return: GdkPixbuf.Pixbuf of size * scale pixels, or None.
+        """
+        flags = Gtk.IconLookupFlags.FORCE_SIZE
+        try:
+            icon_info = self._icon_theme.lookup_by_gicon_for_scale(
+                Gio.Icon.new_for_string(icon_name), size, scale, flags)
+            if icon_info:
+                return icon_info.load_icon()
+        except GLib.Error:
+            pass
+        icon_info = self._icon_theme.lookup_icon_for_scale(
+            "image-missing", size, scale, flags)
+        return icon_info.load_icon() if icon_info else None
+
+    def _on_theme_changed(self, icon_theme):
+        """Drop all icons when the icon theme changes.
+
+        :param icon_theme: Gtk.IconTheme which changed.
+        :return: None
+        """
+        self._pixbufs.clear()
+
+    def get_pixbuf(self, icon_name, size, scale):
+        """Get an icon, loading it only if it is not already cached.
+
+        :param icon_name: String form of a Gio.Icon, usually a themed name.
+        :param size: Icon size in logical pixels.
+        :param scale: Scale factor of the widget showing the icon.
+        :return: GdkPixbuf.Pixbuf of size * scale pixels, or None.
+        """
+        key = (icon_name, size, scale)
+        if key in self._pixbufs:
+            self._pixbufs.move_to_end(key)
+            return self._pixbufs[key]
+
+        pixbuf = self._load_pixbuf(icon_name, size, scale)
+        self._pixbufs[key] = pixbuf
+        if len(self._pixbufs) > self._MAX_ICONS:
+            self._pixbufs.popitem(last=False)
+        return pixbuf
+
+    def set_image(self, image, icon_name, icon_size):
+        """Show a cached icon in a Gtk.Image.
+
+        :param image: Gtk.Image to show the icon in.
+        :param icon_name: String form of a Gio.Icon, usually a themed name.
+        :param icon_size: Gtk.IconSize to show the icon at.
+        :return: None
+        """
+        size = Gtk.icon_size_lookup(icon_size)[1]
+        scale = image.get_scale_factor()
+        pixbuf = self.get_pixbuf(icon_name, size, scale)
+        if scale == 1 or pixbuf is None:
+            image.set_from_pixbuf(pixbuf)
+        else:
+            image.set_from_surface(
+                Gdk.cairo_surface_create_from_pixbuf(pixbuf, scale, None))
+
+
+class _SharedAppStore:
+    """Single list store of every app in the catalog, shared by combo boxes.
+
+    Rows hold a slot, which maps to the catalog index of an app, after a
+    first row of -1 for the "(Choose An App)" placeholder. Combo boxes listing
+    every app use the store directly, and others show it through a filtered
+    view of their own, so apps are only turned into rows once.
+
+    When the catalog is reloaded, rows are added, removed and redrawn to
+    match it rather than being rebuilt, so combo boxes keep their selection.
+    """
+
+    _default = None
+
+    def __init__(self):
+        self._app_ids = None
+        self._app_names = None
+        self._icon_names = None
+        self._store = None
+        self._slot_apps = []
+        self._slot_iters = {}
+        self._app_slots = {}
+        self._prefix_search = None
+        self._combos = weakref.WeakSet()
+
+    @classmethod
+    def get_default(cls):
+        """Get the store shared by all combo boxes in this process.
+
+        :return: The default _SharedAppStore.
+        """
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def _apply_catalog_changes(self, catalog):
+        """Update rows in place to match the reloaded catalog.
+
+        Combo boxes are given the new apps before rows are added, as their
+        views decide whether to show added rows as they are inserted. Rows
+        whose icon changed, or which a combo box now shows or hides, are
+        reported as changed.
+
+        :param catalog: AppCatalog which has been reloaded.
+        :return: None
+        """
+        old_icons = self._icon_names
+        kept, removed, added = _match_rows(self._slot_apps, self._app_ids,
+                                           self._app_names, catalog)
+        self._app_ids = catalog.get_app_ids()
+        self._app_names = catalog.get_display_names()
+        self._icon_names = catalog.get_icon_names()
+        self._prefix_search = catalog.get_prefix_searcher()
+
+        for slot in removed:
+            self._store.remove(self._slot_iters.pop(slot))
+            self._slot_apps[slot] = None
+        index_map = {self._slot_apps[slot]: i for slot, i in kept.items()}
+        changed_slots = set()
+        for slot, i in kept.items():
+            if old_icons[self._slot_apps[slot]] != self._icon_names[i]:
+                changed_slots.add(slot)
+            self._slot_apps[slot] = i
+
+        app_slots = {i: slot for slot, i in kept.items()}
+        for combo in list(self._combos):
+            changed_slots.update(
+                app_slots[i] for i in combo._update_apps(catalog, index_map)
+                if i in app_slots)
+
+        # Kept rows are still in catalog order, so new rows go between them.
+        present_apps = sorted(kept.values())
+        for i in added:
+            position = bisect.bisect(present_apps, i)
+            present_apps.insert(position, i)
+            slot = len(self._slot_apps)
+            self._slot_apps.append(i)
+            self._slot_iters[slot] = self._store.insert(position + 1, [slot])
+        for slot in changed_slots:
+            tree_iter = self._slot_iters[slot]
+            self._store.row_changed(self._store.get_path(tree_iter),
+                                    tree_iter)
+        self._app_slots = {i: slot for slot, i in enumerate(self._slot_apps)
+                           if i is not None}
+        for combo in list(self._combos):
+            combo._finish_apps_update()
+
+    def _on_catalog_changed(self, catalog):
+        """Reload the catalog when installed applications change.
+
+        :param catalog: AppCatalog which was invalidated.
+        :return: None
+        """
+        if self._combos:
+            catalog.load_async(self.get_store)
+
+    def add_combo(self, combo):
+        """Keep a combo box up to date when the catalog is reloaded.
+
+        :param combo: AppChooserComboBox showing the store.
+        :return: None
+        """
+        self._combos.add(combo)
+
+    def get_app_slots(self):
+        """Get the dictionary mapping app indices to their slots.
+
+        :return: Dictionary of slots, replaced when the catalog is reloaded.
+        """
+        return self._app_slots
+
+    def get_prefix_searcher(self):
+        """Get a function searching the apps the rows were last matched to.
+
+        Unlike searching the catalog, which reloads it if it was invalidated,
+        the indices returned are those of get_app_slots until the rows have
+        been updated.
+
+        :return: Function as returned by AppCatalog.get_prefix_searcher.
+        """
+        return self._prefix_search
+
+    def get_slot_iter(self, slot):
+        """Get the row of a slot.
+
+        :param slot: Slot of the row.
+        :return: Gtk.TreeIter of the row in the store.
+        """
+        return self._slot_iters[slot]
+
+    def get_slot_apps(self):
+        """Get the list mapping slots to app indices, updated in place.
+
+        :return: List of app indices, or None for slots of removed rows.
+        """
+        return self._slot_apps
+
+    def get_store(self, catalog):
+        """Get the store of the catalog's apps, updating it if they changed.
+
+        :param catalog: AppCatalog to list the apps of.
+        :return: Gtk.ListStore with a single int column of slots.
+        """
+        app_ids = catalog.get_app_ids()
+        if self._store is None:
+            self._store = Gtk.ListStore(int)
+            self._store.append([-1])
+            for i in range(len(app_ids)):
+                self._slot_iters[i] = self._store.append([i])
+                self._slot_apps.append(i)
+                self._app_slots[i] = i
+            self._app_ids = app_ids
+            self._app_names = catalog.get_display_names()
+            self._icon_names = catalog.get_icon_names()
+            self._prefix_search = catalog.get_prefix_searcher()
+            catalog.add_changed_callback(self._on_catalog_changed)
+        elif app_ids is not self._app_ids:
+            self._apply_catalog_changes(catalog)
+        return self._store
+
+
+def _get_app_info(app_ids, get_app_info_at, app_index):
+    """Get the Gio.AppInfo of an app listed by a widget.
+
+    :param app_ids: The widget's copy of the catalog's app IDs.
+    :param get_app_info_at: Function returned by
+                            AppCatalog.get_app_info_getter when the app IDs
+                            were copied.
+    :param app_index: Index of the app in the widget's copy.
+    :return: Gio.AppInfo of the app, or None if it is no longer installed.
+    """
+    app_id = app_ids[app_index]
+    if app_id is None:
+        # Apps without IDs are only found by index, which a reload the widget
+        # has not applied yet may have given to another app
+        return get_app_info_at(app_index)
+    return AppCatalog.get_default().get_app_info(app_id)
+
+
+def _match_rows(slot_apps, old_ids, old_names, catalog):
+    """Match the rows of a model to the apps of a reloaded catalog by app ID.
+
+    Rows are identified by slots, which keep their app for as long as their
+    row exists. An app which was renamed is treated as removed and added
+    again, as its row has to move.
+
+    :param slot_apps: List mapping slots to app indices in the previous
+                      catalog, or to None for slots whose row was removed.
+    :param old_ids: App IDs of the previous catalog.
+    :param old_names: Display names of the previous catalog.
+    :param catalog: AppCatalog which has been reloaded.
+    :return: Tuple of a dictionary mapping the slots of kept rows to app
+             indices in the new catalog, a list of the slots of rows to
+             remove and an ascending list of the new apps without a row.
+    """
+    new_names = catalog.get_display_names()
+    kept = {}
+    removed = []
+    for slot, old_index in enumerate(slot_apps):
+        if old_index is None:
+            continue
+        new_index = catalog.get_app_index(old_ids[old_index])
+        if new_index is None or new_names[new_index] != old_names[old_index]:
+            removed += [slot]
+        else:
+            kept[slot] = new_index
+    kept_apps = set(kept.values())
+    added = [i for i in range(len(new_names)) if i not in kept_apps]
+    return kept, removed, added
+
+
+def _render_app_icon(cell_layout, cell, tree_model, tree_iter, widget):
+    """Cell data function which resolves the icon of the app in column 0.
+
+    Rows hold only a slot, which the widget maps to the catalog index of the
+    row's app, or -1 for a placeholder. Icons are only looked up for rows
+    being drawn or measured, through the shared _IconCache.
+
+    :param cell_layout: Gtk.CellLayout containing the cell.
+    :param cell: Gtk.CellRendererPixbuf to set the icon on.
+    :param tree_model: Gtk.TreeModel containing the row.
+    :param tree_iter: Gtk.TreeIter of the row being rendered.
+    :param widget: Widget the icon is rendered in, holding the slots and
+                   icon names of the catalog it was populated from.
+    :return: None
+    """
+    slot = tree_model.get_value(tree_iter, 0)
+    icon_name = widget._icon_names[widget._slot_apps[slot]] if slot >= 0 \
+        else "gtk-search"
+    size = Gtk.icon_size_lookup(Gtk.IconSize.MENU)[1]
+    scale = widget.get_scale_factor()
+    pixbuf = _IconCache.get_default().get_pixbuf(icon_name, size, scale)
+    if scale == 1 or pixbuf is None:
+        cell.set_property("pixbuf", pixbuf)
+    else:
+        cell.set_property("surface", Gdk.cairo_surface_create_from_pixbuf(
+            pixbuf, scale, None))
+
+
+def _render_app_name(cell_layout, cell, tree_model, tree_iter, widget):
+    """Cell data function which shows the name of the app in column 0.
+
+    :param cell_layout: Gtk.CellLayout containing the cell.
+    :param cell: Gtk.CellRendererText to set the name on.
+    :param tree_model: Gtk.TreeModel containing the row.
+    :param tree_iter: Gtk.TreeIter of the row being rendered.
+    :param widget: Widget the name is rendered in, holding the slots and
+                   display names of the catalog it was populated from.
+    :return: None
+    """
+    slot = tree_model.get_value(tree_iter, 0)
+    cell.set_property("text", widget._app_names[widget._slot_apps[slot]]
+                      if slot >= 0 else "(Choose An App)")
 
 
 class AppChooserDialog(Gtk.Dialog):
@@ -28,8 +440,37 @@ class AppChooserDialog(Gtk.Dialog):
     
     The Gio.AppInfo of the selected app is made available as the result of the 
     run method, or by the get_selected_app method.
+
+    The "filter-error" signal is emitted with a message when the filter term
+    is not a valid regex pattern, or takes longer than the match time budget.
+    The "timing" signal is emitted while timings are collected.
+
+    While the dialog is running, apps which are installed, removed or changed
+    are added to, removed from or updated in the list in place.
+
+    A reusable dialog is hidden rather than destroyed once run, keeping its
+    rows up to date for the next run, and can have its rows added while idle
+    before it is first shown, see prewarm.
+
+    Only the apps able to open every file set with set_files are listed, once
+    the types of the files have been detected in the background.
     """
 
+    __gsignals__ = {
+        "filter-error": (GObject.SignalFlags.RUN_FIRST, None, (str,)),
+        "timing": (GObject.SignalFlags.RUN_FIRST, None, (str, float, int)),
+    }
+
+    # Apps checked between clock reads, and seconds of filtering per idle call
+    _FILTER_BATCH = 128
+    _FILTER_SLICE = 0.005
+    # Rows added per idle call when loading asynchronously, after a first
+    # batch holding a screenful of apps matching the filter term
+    _LOAD_BATCH = 200
+    _FIRST_SCREEN = 50
+    # Maximum number of apps shown for a fuzzy filter term
+    _FUZZY_LIMIT = 100
+
     def __init__(self, parent=None):
         super().__init__()
 
@@ -40,10 +481,38 @@ class AppChooserDialog(Gtk.Dialog):
             self.set_parent(parent)
 
         self._mime_types = []
+        self._files = []
+        self._file_types = []
         self._filter_term = ""
-        self._selected_app = ""
+        self._selected_slot = None
         self._use_regex = False
-        self._app_list = []
+        self._use_fuzzy = False
+        self._use_frecency = False
+        self._app_ids = []
+        self._app_info_at = None
+        self._app_names = []
+        self._icon_names = []
+        self._slot_apps = []
+        self._base_ranks = {}
+        self._row_iters = {}
+        self._visible_apps = set()
+        self._ranked_apps = []
+        self._applied_term = ""
+        self._filter_delay = 100
+        self._idle_job = None
+        self._idle_source = None
+        self._load_async = False
+        self._loading = False
+        self._reloading = False
+        self._watching = False
+        self._reusable = False
+        self._filter_in_thread = False
+        self._filter_generation = 0
+        self._populated_types = None
+        self._match_time_budget = 0
+        self._filter_error = None
+        self._timings = None
+        self._report_load = False
 
         # Widgets start here
 
@@ -58,24 +527,48 @@ class AppChooserDialog(Gtk.Dialog):
         filter_box.pack_start(self._filter_entry, True, True, 0)
         filter_box.pack_start(filter_clear_button, False, False, 0)
 
-        # App view
-        self._list_store = Gtk.ListStore(str, str, int)
+        # Busy indicator, only shown while loading asynchronously
+        self._spinner = Gtk.Spinner()
+        self._spinner.set_no_show_all(True)
+        filter_box.pack_start(self._spinner, False, False, 0)
+
+        # App view, rows hold a slot, visibility and rank. Slots map to app
+        # indices, and are kept when the catalog is reloaded. Rows are hidden
+        # by the filter model rather than removed and are sorted by rank,
+        # which follows the app index unless fuzzy matching.
+        self._list_store = Gtk.ListStore(int, bool, float)
+        self._list_store.set_sort_column_id(2, Gtk.SortType.ASCENDING)
+        self._filter_model = self._list_store.filter_new()
+        self._filter_model.set_visible_column(1)
         pixbuf_renderer = Gtk.CellRendererPixbuf()
         text_renderer = Gtk.CellRendererText()
-        icon_column = Gtk.TreeViewColumn("icon", pixbuf_renderer, icon_name=0)
-        text_column = Gtk.TreeViewColumn("text", text_renderer, text=1)
+        icon_column = Gtk.TreeViewColumn("icon", pixbuf_renderer)
+        text_column = Gtk.TreeViewColumn("text", text_renderer)
 
         self._app_view = Gtk.TreeView()
-        self._app_view.set_model(self._list_store)
+        self._app_view.set_model(self._filter_model)
         self._app_view.set_headers_visible(False)
         self._app_view.append_column(icon_column)
         self._app_view.append_column(text_column)
 
-        scroller = Gtk.ScrolledWindow()
-        scroller.add(self._app_view)
+        # Fixed row sizes let the view measure rows without resolving icons,
+        # so icons are only loaded for the rows which are drawn.
+        icon_size = Gtk.icon_size_lookup(Gtk.IconSize.MENU)[1]
+        pixbuf_renderer.set_fixed_size(icon_size, icon_size)
+        icon_column.set_cell_data_func(pixbuf_renderer, _render_app_icon,
+                                       self)
+        text_column.set_cell_data_func(text_renderer, _render_app_name, self)
+        icon_column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+        icon_column.set_fixed_width(icon_size + 8)
+        text_column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+        text_column.set_expand(True)
+        self._app_view.set_fixed_height_mode(True)
+
+        self._scroller = Gtk.ScrolledWindow()
+        self._scroller.add(self._app_view)
 
         app_box_frame = Gtk.Frame()
-        app_box_frame.add(scroller)
+        app_box_frame.add(self._scroller)
 
         # Pack widgets in dialog
         content_box = self.get_content_area()
@@ -94,77 +587,645 @@ class AppChooserDialog(Gtk.Dialog):
         self.add_button(Gtk.STOCK_CANCEL, 0)
 
         # Connect signals
-        self._filter_entry.connect("changed", self._filter_apps)
+        self._filter_handler = self._filter_entry.connect("changed",
+                                                          self._filter_apps)
         filter_clear_button.connect("clicked", lambda button:
                                     self._filter_entry.set_text(""))
-        self._app_view.connect("cursor-changed", self._on_app_selected)
+        self._select_handler = self._app_view.connect("cursor-changed",
+                                                      self._on_app_selected)
         self._app_view.connect("row-activated", self._on_app_activated)
+        self.connect("destroy", self._on_destroy)
+
+    def _add_row(self, app_index, visible, rank):
+        """Add a row for an app, in a new slot.
+
+        :param app_index: Index of the app in the catalog.
+        :param visible: Whether the row is shown.
+        :param rank: Position of the row when not fuzzily ranked.
+        :return: None
+        """
+        self._row_iters[app_index] = self._list_store.append(
+            [len(self._slot_apps), visible, rank])
+        self._slot_apps.append(app_index)
+        self._base_ranks[app_index] = rank
+
+    def _apply_catalog_changes(self, catalog):
+        """Update rows in place to match the reloaded catalog.
+
+        Rows of removed apps are removed, rows of new apps are added hidden
+        with a rank between their neighbours, and rows whose icon changed
+        are redrawn, after which every row is filtered again.
+
+        :param catalog: AppCatalog which has been reloaded.
+        :return: None
+        """
+        old_icons = self._icon_names
+        kept, removed, added = _match_rows(self._slot_apps, self._app_ids,
+                                           self._app_names, catalog)
+        self._app_ids = catalog.get_app_ids()
+        self._app_info_at = catalog.get_app_info_getter()
+        self._app_names = catalog.get_display_names()
+        self._icon_names = catalog.get_icon_names()
+        if self._mime_types or self._file_types:
+            candidates = catalog.get_type_matches(self._mime_types,
+                                                  self._file_types)
+            removed += [slot for slot, i in kept.items()
+                        if i not in candidates]
+            kept = {slot: i for slot, i in kept.items() if i in candidates}
+            added = [i for i in added if i in candidates]
+
+        self._app_view.handler_block(self._select_handler)
+        for slot in removed:
+            old_index = self._slot_apps[slot]
+            self._list_store.remove(self._row_iters.pop(old_index))
+            del self._base_ranks[old_index]
+            self._slot_apps[slot] = None
+
+        # Carry state over from the old app indices to the new ones.
+        index_map = {self._slot_apps[slot]: i for slot, i in kept.items()}
+        for slot, i in kept.items():
+            if old_icons[self._slot_apps[slot]] != self._icon_names[i]:
+                tree_iter = self._row_iters[self._slot_apps[slot]]
+                self._list_store.row_changed(
+                    self._list_store.get_path(tree_iter), tree_iter)
+            self._slot_apps[slot] = i
+        self._row_iters = {index_map[i]: tree_iter
+                           for i, tree_iter in self._row_iters.items()}
+        self._base_ranks = {index_map[i]: rank
+                            for i, rank in self._base_ranks.items()}
+        self._visible_apps = {index_map[i] for i in self._visible_apps
+                              if i in index_map}
+        self._ranked_apps = [index_map[i] for i in self._ranked_apps
+                             if i in index_map]
+
+        # New apps are ranked evenly between the kept apps around them. Base
+        # ranks are never negative, keeping them apart from ranked rows.
+        kept_apps = sorted(self._base_ranks)
+        for position, group in itertools.groupby(
+                added, key=lambda i: bisect.bisect(kept_apps, i)):
+            group = list(group)
+            low = self._base_ranks[kept_apps[position - 1]] if position \
+                else None
+            high = self._base_ranks[kept_apps[position]] \
+                if position < len(kept_apps) else None
+            if low is None:
+                low = 0.0
+            if high is None:
+                high = low + len(group) + 1
+            step = (high - low) / (len(group) + 1)
+            for offset, i in enumerate(group, 1):
+                self._add_row(i, False, low + step * offset)
+        if len(set(self._base_ranks.values())) < len(self._base_ranks):
+            # Ranks ran out of precision, or of room above zero, so
+            # number them again.
+            for i, tree_iter in self._row_iters.items():
+                self._base_ranks[i] = float(i)
+                if i not in self._ranked_apps:
+                    self._list_store.set_value(tree_iter, 2, float(i))
+        self._app_view.handler_unblock(self._select_handler)
+        self._on_app_selected(self._app_view)
+
+    def _apply_matches(self, filter_term, result):
+        """Show the apps matched by a match job, or report its error.
+
+        :param filter_term: String the apps were matched against.
+        :param result: Tuple returned by the match job, see _get_match_job.
+        :return: None
+        """
+        matches, ranking, error, spent, candidate_count = result
+        if error:
+            self._set_filter_error(error)
+            return
+        if self._timings:
+            self._timings.record(self, "filter", spent * 1000,
+                                 candidate_count)
+        self._set_filter_error(None)
+        if ranking is None and self._use_frecency:
+            ranking = AppCatalog.get_default().get_used_apps(matches)
+        self._show_apps(matches, ranking)
+        self._applied_term = filter_term
+
+    def _bulk_load(self, app_indices, shown_apps):
+        """Add a row for every app at once, to a store detached from the view.
+
+        Neither the view nor the filter model is told of each row as it is
+        added, and rows are sorted once rather than as each is added. The
+        view is given the new store through a new filter model once filled.
+
+        :param app_indices: List of indices of apps to add, in catalog order.
+        :param shown_apps: Set of indices of apps to show, or None to show
+                           every app.
+        :return: None
+        """
+        self._app_view.set_model(None)
+        self._list_store = Gtk.ListStore(int, bool, float)
+        for i in app_indices:
+            self._add_row(i, shown_apps is None or i in shown_apps, float(i))
+        for rank, i in enumerate(self._ranked_apps, -len(self._ranked_apps)):
+            self._list_store.set_value(self._row_iters[i], 2, float(rank))
+        self._list_store.set_sort_column_id(2, Gtk.SortType.ASCENDING)
+        self._filter_model = self._list_store.filter_new()
+        self._filter_model.set_visible_column(1)
+        self._app_view.set_model(self._filter_model)
+
+    def _cancel_idle_job(self):
+        """Cancel any scheduled or partially completed loading or filtering.
+
+        Matching in a worker thread stops at its next time slice.
+
+        :return: None
+        """
+        self._filter_generation += 1
+        if self._idle_source:
+            GLib.source_remove(self._idle_source)
+        self._idle_source = None
+        self._idle_job = None
+
+    def _continue_idle_job(self):
+        """Run one time slice of the current loading or filtering job.
+
+        :return: Whether the job has more work to do.
+        """
+        if next(self._idle_job, False):
+            return True
+        self._idle_job = None
+        self._idle_source = None
+        self._loading = False
+        return False
 
     def _filter_apps(self, entry):
-        """Filter apps based on filter term, used when filter term changes.
+        """Schedule filtering of apps, used when filter term changes.
+
+        Changes are coalesced until the entry has been left alone for the
+        filter delay, and a newer change cancels any pass still in progress.
+
+        Rows being loaded asynchronously are filtered once loading completes.
 
-        If use_regex is True, the provided string will be used as the pattern
-        for a regex match, otherwise basic case-insensitive matching is used.
-        
         :param entry: Text entry containing filter text.
         :return: None
         """
-        self._filter_term = entry.get_text()
+        if self._loading or self._reloading:
+            return
+        self._cancel_idle_job()
+        if self._filter_delay:
+            self._idle_source = GLib.timeout_add(self._filter_delay,
+                                                   self._start_filter)
+        else:
+            self._start_filter()
+
+    def _filter_pass(self, filter_term):
+        """Filter apps based on a filter term, yielding between time slices.
+
+        Rows are only shown or hidden once every candidate has been checked,
+        see _get_match_job.
+
+        :param filter_term: String used for filtering apps by display name.
+        :return: Generator yielding True after each time slice.
+        """
+        result = yield from self._get_match_job(filter_term)
+        self._apply_matches(filter_term, result)
+
+    def _finish_filter_thread(self, generation, filter_term, result):
+        """Show the apps matched by a worker thread, called in the main loop.
+
+        Results are dropped if another filter pass has started since, or rows
+        are being added or updated.
+
+        :param generation: Value of the filter generation when matching began.
+        :param filter_term: String the apps were matched against.
+        :param result: Tuple returned by the match job.
+        :return: False, so that the idle source is removed.
+        """
+        if generation == self._filter_generation and not self._loading and \
+                not self._reloading:
+            self._apply_matches(filter_term, result)
+        return False
+
+    def _finish_run(self, response):
+        """Hide or destroy the dialog once a response has been chosen.
+
+        :param response: Response ID the dialog was closed with.
+        :return: Gio.AppInfo of the selected app if "OK" was chosen,
+                 otherwise None.
+        """
+        selected_app = self.get_selected_app() if response == 1 else None
+        if self._reusable:
+            self.hide()
+        else:
+            self.destroy()
+        if self._use_frecency and selected_app:
+            AppUsage.get_default().record(selected_app.get_id())
+        return selected_app
+
+    def _get_match_job(self, filter_term):
+        """Make a job matching apps against a filter term.
+
+        If use_regex is True, the provided string will be used as the pattern
+        for a regex match. Otherwise if use_fuzzy is True, the best fuzzy
+        matches are ranked, or basic case-insensitive matching is used.
+
+        When a basic term only narrows the previously applied term, just the
+        apps which are currently visible are checked again, otherwise every
+        app is checked, as it is when no term has been applied yet.
+
+        The job only reads copies of the rows taken here, and functions bound
+        to the catalog's current apps, which are replaced rather than changed
+        when the catalog is reloaded, so it may run in a worker thread.
+
+        :param filter_term: String used for filtering apps by display name.
+        :return: Generator yielding True after each time slice, returning a
+                 tuple of the set of matching apps, a list ranking them or
+                 None, a message describing why the filter term could not be
+                 used or None, and the seconds spent and number of apps
+                 checked.
+        """
+        catalog = AppCatalog.get_default()
+        row_apps = list(self._row_iters)
+        if not filter_term:
+            return self._run_match_job(row_apps, [])
+        elif self._use_regex:
+            try:
+                is_match = catalog.get_matcher(filter_term, use_regex=True)
+            except ValueError as error:
+                return self._run_match_job(row_apps, [], error=str(error))
+            return self._run_match_job(row_apps, row_apps, is_match)
+        elif self._use_fuzzy and normalize_text(filter_term):
+            return self._run_match_job(row_apps, [],
+                                       rank=catalog.get_ranker(filter_term))
+        if self._applied_term is not None and \
+                normalize_text(self._applied_term) in \
+                normalize_text(filter_term):
+            candidates = list(self._visible_apps)
+        else:
+            candidates = row_apps
+        return self._run_match_job(row_apps, candidates,
+                                   catalog.get_matcher(filter_term))
+
+    def _on_catalog_changed(self, catalog):
+        """Reload the catalog when installed applications change.
+
+        Rows still being added are added again from the reloaded catalog,
+        otherwise the changes are applied to the existing rows.
+
+        :param catalog: AppCatalog which was invalidated.
+        :return: None
+        """
+        if self._loading:
+            if self._idle_job:
+                self._cancel_idle_job()
+                catalog.load_async(self._on_catalog_loaded)
+            return  # Otherwise the pending load brings the changes
+        self._cancel_idle_job()
+        self._reloading = True
+        catalog.load_async(self._on_catalog_reloaded)
+
+    def _on_catalog_loaded(self, catalog):
+        """Start adding rows once the catalog has been loaded asynchronously.
+
+        :param catalog: AppCatalog which finished loading.
+        :return: None
+        """
+        if self._loading:
+            self._cancel_idle_job()
+            self._idle_job = self._populate()
+            self._idle_source = GLib.idle_add(self._continue_idle_job)
+
+    def _on_catalog_reloaded(self, catalog):
+        """Apply changes to installed apps, then filter every row again.
+
+        :param catalog: AppCatalog which finished reloading.
+        :return: None
+        """
+        if not self._watching or not self._reloading:
+            return
+        self._reloading = False
+        self._apply_catalog_changes(catalog)
+        self._applied_term = None
+        self._start_filter()
+
+    def _on_destroy(self, dialog):
+        """Stop keeping rows up to date once the dialog is destroyed.
+
+        :param dialog: The dialog being destroyed (self).
+        :return: None
+        """
+        if self._watching:
+            AppCatalog.get_default().remove_changed_callback(
+                self._on_catalog_changed)
+        self._watching = False
+        self._loading = False
+        self._reloading = False
+        self._cancel_idle_job()
+
+    def _on_files_detected(self, files, content_types):
+        """Store the types of the files set, updating rows while shown.
+
+        :param files: List of file paths the types were detected for.
+        :param content_types: List of content types, one per file.
+        :return: None
+        """
+        if files is not self._files:
+            return  # Other files were set while detecting
+        self._file_types = sorted(set(content_types))
+        if self.get_visible():
+            self._update_rows()
+
+    def _populate(self):
+        """Fill the list store with every app matching the MIME types.
+
+        When loading asynchronously, rows are added in batches, yielding
+        between them. The first batch is a screenful of apps matching the
+        current filter term, streamed from the catalog, so they are shown
+        before the remaining rows are added hidden. Otherwise every row is
+        added at once through _bulk_load. The filter term is applied to every
+        row once all are added.
+
+        :return: Generator yielding True after each batch of rows.
+        """
+        catalog = AppCatalog.get_default()
+        self._populated_types = (list(self._mime_types),
+                                 list(self._file_types))
+        self._app_ids = catalog.get_app_ids()
+        self._app_info_at = catalog.get_app_info_getter()
+        self._app_names = catalog.get_display_names()
+        self._icon_names = catalog.get_icon_names()
+        if self._timings and self._report_load:
+            self._timings.record_catalog_load(self, catalog)
+        self._report_load = False
+
+        batch_start = time.monotonic()
+        app_indices = catalog.query_indices(mime_types=self._mime_types,
+                                            file_types=self._file_types)
+        self._filter_term = self._filter_entry.get_text()
+        filtered = bool(self._filter_term)
+        folded = bool(normalize_text(self._filter_term))
+        try:
+            first_apps = catalog.query_indices(
+                self._filter_term, self._mime_types, self._use_regex,
+                self._use_fuzzy, self._FIRST_SCREEN, 0, self._use_frecency,
+                self._file_types)
+        except ValueError:
+            # Rows are all shown while the filter term is in error
+            first_apps = app_indices[:self._FIRST_SCREEN]
+            filtered = False
+        if filtered and folded and self._use_fuzzy and not self._use_regex:
+            self._ranked_apps = first_apps
+        elif self._use_frecency:
+            self._ranked_apps = catalog.get_used_apps(set(first_apps))
+        else:
+            self._ranked_apps = []
+
+        self._slot_apps = []
+        self._base_ranks = {}
+        self._row_iters = {}
+        self._applied_term = None
+        if not self._loading:
+            self._bulk_load(app_indices,
+                            set(first_apps) if filtered else None)
+            self._visible_apps = set(first_apps) if filtered \
+                else set(app_indices)
+            if self._timings:
+                self._timings.record(self, "render",
+                                     (time.monotonic() - batch_start) * 1000,
+                                     len(app_indices))
+            yield from self._filter_pass(self._filter_term)
+            return
+
         self._list_store.clear()
+        for i in first_apps:
+            self._add_row(i, True, float(i))
+        for rank, i in enumerate(self._ranked_apps, -len(self._ranked_apps)):
+            self._list_store.set_value(self._row_iters[i], 2, float(rank))
+        self._visible_apps = set(self._row_iters)
+        spent = time.monotonic() - batch_start
+        yield True
+
+        show_rest = not filtered
+        remaining_apps = [i for i in app_indices if i not in self._row_iters]
+        for start in range(0, len(remaining_apps), self._LOAD_BATCH):
+            batch_start = time.monotonic()
+            for i in remaining_apps[start:start + self._LOAD_BATCH]:
+                self._add_row(i, show_rest, float(i))
+                if show_rest:
+                    self._visible_apps.add(i)
+            spent += time.monotonic() - batch_start
+            yield True
+
+        if self._timings:
+            self._timings.record(self, "render", spent * 1000,
+                                 len(app_indices))
+
+        if self._loading:
+            self._loading = False
+            self._spinner.stop()
+            self._spinner.hide()
+        self._filter_term = self._filter_entry.get_text()
+        yield from self._filter_pass(self._filter_term)
+
+    def _prepare_run(self):
+        """Bring the rows up to date for the dialog's settings before showing.
+
+        Rows kept from an earlier run, or added by prewarm, are only filtered
+        again for the current filter term, unless the MIME types or files
+        changed.
+
+        :return: None
+        """
+        self._filter_entry.handler_block(self._filter_handler)
+        self._filter_entry.set_text(self._filter_term)
+        self._filter_entry.handler_unblock(self._filter_handler)
+        self._update_rows()
+
+    def _update_rows(self):
+        """Bring the rows up to date for the MIME types and files.
+
+        :return: None
+        """
+        catalog = AppCatalog.get_default()
+        self._watch_catalog()
+        if self._loading:
+            # Rows are still being added, and are filtered once they are
+            self._spinner.show()
+            self._spinner.start()
+        elif self._populated_types == (self._mime_types, self._file_types):
+            if not self._reloading:  # Otherwise filtered once reloaded
+                self._cancel_idle_job()
+                self._applied_term = None
+                self._start_filter()
+        elif self._load_async:
+            self._report_load = not catalog.is_loaded()
+            self._loading = True
+            self._spinner.show()
+            self._spinner.start()
+            catalog.load_async(self._on_catalog_loaded)
+        else:
+            self._report_load = not catalog.is_loaded()
+            self._cancel_idle_job()
+            self._reloading = False
+            for _ in self._populate():
+                pass
+
+    def _run_filter_thread(self, generation, filter_term, job):
+        """Run a match job to completion, run in a worker thread.
 
-        if self._filter_term == "":
-            for i in range(len(self._app_list)):
-                app = self._app_list[i]
-                if self._mime_types:
-                    supported_types_specific = app.get_supported_types()
-                    supported_types_general = []
-                    for mime_type in supported_types_specific:
-                        mime_type = mime_type.split('/')
-                        if mime_type[0] not in supported_types_general:
-                            supported_types_general += [mime_type[0]]
-                    no_match = True
-                    for mime_type in self._mime_types:
-                        if mime_type in supported_types_general or \
-                                        mime_type in supported_types_specific:
-                            no_match = False
-                            break
-                    if no_match:
-                        continue
-                icon = self._app_list[i].get_icon()
-                app_icon = icon.to_string() if icon else "gtk-missing-icon"
-                app_name = self._app_list[i].get_display_name()
-                self._list_store.append([app_icon, app_name, i])
+        The job is abandoned as soon as another filter pass starts, and only
+        its result is passed back to the main loop.
+
+        :param generation: Value of the filter generation when it began.
+        :param filter_term: String the apps are matched against.
+        :param job: Generator returned by _get_match_job.
+        :return: None
+        """
+        try:
+            while True:
+                next(job)
+                if generation != self._filter_generation:
+                    return
+        except StopIteration as stop:
+            GLib.idle_add(self._finish_filter_thread, generation,
+                          filter_term, stop.value)
+
+    def _run_match_job(self, row_apps, candidates, is_match=None, rank=None,
+                       error=None):
+        """Match apps, yielding between time slices, see _get_match_job.
+
+        :param row_apps: List of the indices of apps with rows.
+        :param candidates: List of the indices of apps to check.
+        :param is_match: Function returned by AppCatalog.get_matcher.
+        :param rank: Function returned by AppCatalog.get_ranker, used instead
+                     of checking candidates.
+        :param error: Message describing why the filter term cannot be used.
+        :return: Generator yielding True after each time slice.
+        """
+        if error:
+            return None, None, error, 0, 0
+        if rank:
+            start = time.monotonic()
+            ranking = rank(self._FUZZY_LIMIT, set(row_apps))
+            return set(ranking), ranking, None, time.monotonic() - start, \
+                len(row_apps)
+        if not is_match:
+            return set(row_apps), None, None, 0, 0
+
+        # A single regex search may be slow, so check the clock after each.
+        budget = self._match_time_budget / 1000
+        batch_size = 1 if budget and self._use_regex else self._FILTER_BATCH
+        matches = set()
+        spent = 0
+        slice_start = time.monotonic()
+        for start in range(0, len(candidates), batch_size):
+            batch = candidates[start:start + batch_size]
+            matches.update(i for i in batch if is_match(i))
+            now = time.monotonic()
+            if budget and spent + now - slice_start > budget:
+                return None, None, "filter term took too long to match", \
+                    0, 0
+            if now - slice_start > self._FILTER_SLICE:
+                spent += now - slice_start
+                yield True
+                slice_start = time.monotonic()
+        spent += time.monotonic() - slice_start
+        return matches, None, None, spent, len(candidates)
+
+    def _set_filter_error(self, error):
+        """Report or clear a problem with the filter term.
+
+        Rows are left unchanged while the filter term is in error.
+
+        :param error: Message describing the problem, or None to clear it.
+        :return: None
+        """
+        self._filter_error = error
+        self._filter_entry.set_icon_from_icon_name(
+            Gtk.EntryIconPosition.SECONDARY, "dialog-error" if error else None)
+        self._filter_entry.set_icon_tooltip_text(
+            Gtk.EntryIconPosition.SECONDARY, error)
+        if error:
+            self.emit("filter-error", error)
+
+    def _show_apps(self, app_indices, ranking=None):
+        """Show only the given apps, keeping the selection and scroll position.
+
+        :param app_indices: Set of indices of apps to show.
+        :param ranking: Optional list of the apps in the order to show them,
+                        otherwise apps are shown in catalog order.
+        :return: None
+        """
+        selection = self._app_view.get_selection()
+        tree_model, tree_iter = selection.get_selected()
+        selected_index = self._slot_apps[tree_model.get_value(tree_iter, 0)] \
+            if tree_iter else None
+        adjustment = self._scroller.get_vadjustment()
+        scroll_value = adjustment.get_value()
+        start = time.monotonic()
+
+        self._app_view.handler_block(self._select_handler)
+        hidden_apps = self._visible_apps - app_indices
+        shown_apps = app_indices - self._visible_apps
+        for i in hidden_apps:
+            self._list_store.set_value(self._row_iters[i], 1, False)
+        for i in shown_apps:
+            self._list_store.set_value(self._row_iters[i], 1, True)
+        self._visible_apps = app_indices
+
+        if ranking or self._ranked_apps:
+            # Re-sort once after updating every rank, rather than per row
+            self._list_store.set_sort_column_id(
+                Gtk.TREE_SORTABLE_UNSORTED_SORT_COLUMN_ID,
+                Gtk.SortType.ASCENDING)
+            for i in self._ranked_apps:
+                self._list_store.set_value(self._row_iters[i], 2,
+                                           self._base_ranks[i])
+            self._ranked_apps = ranking or []
+            first_rank = -len(self._ranked_apps)
+            for rank, i in enumerate(self._ranked_apps, first_rank):
+                self._list_store.set_value(self._row_iters[i], 2,
+                                           float(rank))
+            self._list_store.set_sort_column_id(2, Gtk.SortType.ASCENDING)
+            scroll_value = 0
+
+        if selected_index in app_indices:
+            child_path = self._list_store.get_path(
+                self._row_iters[selected_index])
+            selection.select_path(
+                self._filter_model.convert_child_path_to_path(child_path))
         else:
-            for i in range(len(self._app_list)):
-                app = self._app_list[i]
-                if self._filter_term:
-                    if self._use_regex:
-                        if not re.search(self._filter_term,
-                                         app.get_display_name()):
-                            continue
-                    else:
-                        if not self._filter_term.lower() in \
-                                app.get_display_name().lower():
-                            continue
-                if self._mime_types:
-                    supported_types_specific = app.get_supported_types()
-                    supported_types_general = []
-                    for mime_type in supported_types_specific:
-                        mime_type = mime_type.split('/')
-                        if mime_type[0] not in supported_types_general:
-                            supported_types_general += [mime_type[0]]
-                    no_match = True
-                    for mime_type in self._mime_types:
-                        if mime_type in supported_types_general or \
-                                        mime_type in supported_types_specific:
-                            no_match = False
-                            break
-                    if no_match:
-                        continue
-                icon = self._app_list[i].get_icon()
-                app_icon = icon.to_string() if icon else "gtk-missing-icon"
-                app_name = self._app_list[i].get_display_name()
-                self._list_store.append([app_icon, app_name, i])
+            selection.unselect_all()
+            self._selected_slot = None
+        self._app_view.handler_unblock(self._select_handler)
+        adjustment.set_value(scroll_value)
+        if self._timings:
+            self._timings.record(self, "render",
+                                 (time.monotonic() - start) * 1000,
+                                 len(hidden_apps) + len(shown_apps) +
+                                 len(self._ranked_apps))
+
+    def _watch_catalog(self):
+        """Start keeping rows up to date with the installed apps.
+
+        :return: None
+        """
+        if not self._watching:
+            AppCatalog.get_default().add_changed_callback(
+                self._on_catalog_changed)
+            self._watching = True
+
+    def _start_filter(self):
+        """Start an idle-time filter pass for the current filter term.
+
+        :return: False, so that a debounce timeout is not repeated.
+        """
+        self._filter_term = self._filter_entry.get_text()
+        if self._filter_in_thread:
+            self._idle_source = None
+            threading.Thread(target=self._run_filter_thread,
+                             args=(self._filter_generation, self._filter_term,
+                                   self._get_match_job(self._filter_term)),
+                             daemon=True).start()
+            return False
+        self._idle_job = self._filter_pass(self._filter_term)
+        self._idle_source = GLib.idle_add(self._continue_idle_job)
+        return False
 
     def _on_app_activated(self, view, path, column):
         """Emulate pressing "OK" when an application is double clicked.
@@ -177,21 +1238,21 @@ class AppChooserDialog(Gtk.Dialog):
         self.response(1)
 
     def _on_app_selected(self, view):
-        """Set the selected app property when the selection changes.
-        
+        """Keep the slot of the selected app when the selection changes.
+
+        The Gio.AppInfo is only resolved when asked for, so moving through
+        the list creates none.
+
         :param view: TreeView in which selection changed.
         :return: None
         """
         selection = self._app_view.get_selection()
         if not selection:
-            self._selected_icon = None
+            self._selected_slot = None
         else:
             tree_model, tree_iter = selection.get_selected()
-            if not tree_iter:
-                self._selected_app = None
-            else:
-                app_index = tree_model.get_value(tree_iter, 2)
-                self._selected_app = self._app_list[app_index]
+            self._selected_slot = tree_model.get_value(tree_iter, 0) \
+                if tree_iter else None
 
     def get_mime_types(self):
         """Get the list of mime types from which to select apps.
@@ -200,6 +1261,27 @@ class AppChooserDialog(Gtk.Dialog):
         """
         return self._mime_types
 
+    def get_collect_timings(self):
+        """Get whether timings of the dialog's work are collected.
+
+        :return: Whether timings are collected.
+        """
+        return self._timings is not None
+
+    def get_filter_delay(self):
+        """Get the delay between typing in the filter entry and filtering.
+
+        :return: Delay in milliseconds.
+        """
+        return self._filter_delay
+
+    def get_files(self):
+        """Get the files which listed apps must be able to open.
+
+        :return: List of file paths.
+        """
+        return self._files
+
     def get_filter_term(self):
         """Get the string used for filtering apps by display name.
 
@@ -207,14 +1289,73 @@ class AppChooserDialog(Gtk.Dialog):
         """
         return self._filter_term
 
+    def get_filter_error(self):
+        """Get the problem with the current filter term, if there is one.
+
+        :return: Message describing the problem, or None.
+        """
+        return self._filter_error
+
+    def get_filter_in_thread(self):
+        """Get whether apps are matched in a worker thread.
+
+        :return: Whether matching is done in a worker thread.
+        """
+        return self._filter_in_thread
+
+    def get_load_async(self):
+        """Get whether apps are loaded after the dialog is shown.
+
+        :return: Whether apps are loaded asynchronously.
+        """
+        return self._load_async
+
+    def get_match_time_budget(self):
+        """Get the time allowed for matching apps in one filter pass.
+
+        :return: Time budget in milliseconds, 0 if unlimited.
+        """
+        return self._match_time_budget
+
+    def get_reusable(self):
+        """Get whether the dialog is hidden rather than destroyed once run.
+
+        :return: Whether the dialog is reusable.
+        """
+        return self._reusable
+
     def get_selected_app(self):
         """Get the Gio.AppInfo of the app selected in the dialog.
 
-        Will be None until the button's dialog has been closed once.
+        :return: Gio.AppInfo of the selected app, or None if no app is
+                 selected.
+        """
+        if self._selected_slot is None:
+            return None
+        app_index = self._slot_apps[self._selected_slot]
+        return _get_app_info(self._app_ids, self._app_info_at, app_index)
 
-        :return: Gio.AppInfo of the selected app.
+    def get_timings(self):
+        """Get running statistics of the time taken by each phase of work.
+
+        :return: Dictionary mapping phase names to dictionaries of "count",
+                 "p50_ms" and "p95_ms", empty unless timings are collected.
         """
-        return self._selected_app
+        return self._timings.get_stats() if self._timings else {}
+
+    def get_use_frecency(self):
+        """Get whether apps chosen often and recently are listed first.
+
+        :return: Whether apps are ranked by frecency.
+        """
+        return self._use_frecency
+
+    def get_use_fuzzy(self):
+        """Get whether apps are fuzzily matched and ranked by the filter term.
+
+        :return: Whether fuzzy matching is used.
+        """
+        return self._use_fuzzy
 
     def get_use_regex(self):
         """ Get whether the filter term should be used as a regex pattern.
@@ -223,22 +1364,56 @@ class AppChooserDialog(Gtk.Dialog):
         """
         return self._use_regex
 
+    def iter_apps(self, limit=None, offset=0):
+        """Yield the apps matching the MIME types and filter term, in order.
+
+        Apps are matched lazily, so taking only the first few does not scan
+        the whole catalog. Files set are matched by the types detected for
+        them in the background, so they restrict no apps until detected. A
+        ValueError is raised on first use if use_regex is True and the filter
+        term is not a valid regex pattern.
+
+        :param limit: Optional maximum number of apps to yield.
+        :param offset: Number of matching apps to skip, for paging.
+        :return: Generator of Gio.AppInfo, best match first when fuzzy
+                 matching, otherwise sorted by display name.
+        """
+        catalog = AppCatalog.get_default()
+        for app_id in catalog.iter_query(self._filter_term, self._mime_types,
+                                         self._use_regex, self._use_fuzzy,
+                                         limit, offset, self._use_frecency,
+                                         self._file_types):
+            yield catalog.get_app_info(app_id)
+
+    def prewarm(self):
+        """Load the catalog and add rows while idle, before the dialog is run.
+
+        Only useful for reusable dialogs, or ones which are run later. Rows
+        are added for the MIME types set when this is called.
+
+        :return: None
+        """
+        if self._loading or \
+                self._populated_types == (self._mime_types, self._file_types):
+            return
+        catalog = AppCatalog.get_default()
+        self._watch_catalog()
+        self._report_load = not catalog.is_loaded()
+        self._loading = True
+        catalog.load_async(self._on_catalog_loaded)
+
     def run(self):
         """Run dialog to select an installed app.
-        
-        :return: None
+
+        The dialog is destroyed once closed, unless it is reusable, in which
+        case it is hidden.
+
+        :return: Gio.AppInfo of the selected app if "OK" was chosen,
+                 otherwise None.
         """
-        self._app_list = Gio.AppInfo.get_all()
-        self._app_list.sort(key=lambda app: app.get_display_name())
-        self._filter_apps(self._filter_entry)
-        if self._filter_term:
-            self.filter_entry.set_text(self._filter_term)
+        self._prepare_run()
         self.show_all()
-        result = super().run()
-        self.destroy()
-        if result == 1:
-            return self._selected_app
-        return None
+        return self._finish_run(super().run())
 
     def set_mime_types(self, mime_types):
         """ Get the list of mime types from which to select apps.
@@ -253,11 +1428,69 @@ class AppChooserDialog(Gtk.Dialog):
                             type(mime_types).__name__)
         self._mime_types = list(set(mime_types))
 
+    def set_files(self, files):
+        """Set the files which listed apps must be able to open, all of them.
+
+        The content types of the files are detected in a worker thread, see
+        AppCatalog.get_content_types, and the rows are updated once they are,
+        even while the dialog is shown.
+
+        :param files: List of file paths. An empty list lists apps for any
+                      files.
+        :return: None
+        """
+        if not type(files) == list:
+            raise TypeError("must be type list, not " + type(files).__name__)
+        if files == self._files:
+            return
+        files = self._files = list(files)
+        if not files:
+            self._on_files_detected(files, [])
+            return
+        AppCatalog.get_default().get_content_types_async(
+            files, lambda content_types: self._on_files_detected(
+                files, content_types))
+
+    def set_collect_timings(self, collect_timings):
+        """Set whether timings of the dialog's work are collected.
+
+        While enabled, the "timing" signal is emitted with the phase name,
+        its duration in milliseconds and the number of apps or rows processed
+        each time the catalog is loaded ("load") and indexed ("index"), apps
+        are matched ("filter") or rows are updated ("render"). Enabling
+        collection resets the statistics returned by get_timings.
+
+        :param collect_timings: Whether timings are collected.
+        :return: None
+        """
+        if not type(collect_timings) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(collect_timings).__name__)
+        self._timings = _Timings() if collect_timings else None
+
+    def set_filter_delay(self, filter_delay):
+        """Set the delay between typing in the filter entry and filtering.
+
+        Changes made within the delay are combined into a single filter pass.
+        A delay of 0 starts filtering on every change.
+
+        :param filter_delay: Delay in milliseconds.
+        :return: None
+        """
+        if not type(filter_delay) == int:
+            raise TypeError("must be type int, not " +
+                            type(filter_delay).__name__)
+        if filter_delay < 0:
+            raise ValueError("filter delay must not be negative")
+        self._filter_delay = filter_delay
+
     def set_filter_term(self, filter_term):
         """Set the string used for filtering apps by display name.
 
         If use_regex is True, the provided string will be used as the pattern
         for a regex match, otherwise basic case-insensitive matching is used.
+        Basic and fuzzy matching also search generic names, keywords,
+        categories and executables, ignoring accents.
 
         Dialog will not update the filter term once it has been shown.
 
@@ -269,6 +1502,101 @@ class AppChooserDialog(Gtk.Dialog):
                             type(filter_term).__name__)
         self._filter_term = filter_term
 
+    def set_filter_in_thread(self, filter_in_thread):
+        """Set whether apps are matched in a worker thread.
+
+        If filter_in_thread is True, each filter pass matches a copy of the
+        rows in a worker thread, and only showing and hiding rows is done in
+        the main loop, so matching many apps never holds up drawing. A pass
+        is abandoned as soon as a newer one starts, and its result dropped.
+
+        :param filter_in_thread: Whether matching is done in a worker thread.
+        :return: None
+        """
+        if not type(filter_in_thread) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(filter_in_thread).__name__)
+        self._filter_in_thread = filter_in_thread
+
+    def set_load_async(self, load_async):
+        """Set whether apps are loaded after the dialog is shown.
+
+        If load_async is True, run shows the dialog straight away with a busy
+        indicator while apps are loaded in a worker thread, and rows are added
+        in batches once they are available.
+
+        :param load_async: Whether apps are loaded asynchronously.
+        :return: None
+        """
+        if not type(load_async) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(load_async).__name__)
+        self._load_async = load_async
+
+    def set_match_time_budget(self, match_time_budget):
+        """Set the time allowed for matching apps in one filter pass.
+
+        A pass which exceeds the budget is abandoned, leaving the previous
+        results shown, and a "filter-error" is reported. Time spent waiting
+        between slices of a pass is not counted.
+
+        :param match_time_budget: Time budget in milliseconds, 0 if unlimited.
+        :return: None
+        """
+        if not type(match_time_budget) == int:
+            raise TypeError("must be type int, not " +
+                            type(match_time_budget).__name__)
+        if match_time_budget < 0:
+            raise ValueError("match time budget must not be negative")
+        self._match_time_budget = match_time_budget
+
+    def set_reusable(self, reusable):
+        """Set whether the dialog is hidden rather than destroyed once run.
+
+        A reusable dialog keeps its rows up to date while hidden, so running
+        it again only filters them for the current filter term, unless the
+        MIME types have changed. It must be destroyed when no longer needed.
+
+        :param reusable: Whether the dialog is reusable.
+        :return: None
+        """
+        if not type(reusable) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(reusable).__name__)
+        self._reusable = reusable
+
+    def set_use_frecency(self, use_frecency):
+        """Set whether apps chosen often and recently are listed first.
+
+        If use_frecency is True, apps are listed by their AppUsage score
+        before any others, unless fuzzily ranked by the filter term, and the
+        chosen app is recorded.
+
+        :param use_frecency: Whether apps are ranked by frecency.
+        :return: None
+        """
+        if not type(use_frecency) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(use_frecency).__name__)
+        self._use_frecency = use_frecency
+
+    def set_use_fuzzy(self, use_fuzzy):
+        """Set whether apps are fuzzily matched and ranked by the filter term.
+
+        If use_fuzzy is True and use_regex is False, apps are shown in order
+        of how well their display names match the filter term, tolerating
+        typos, otherwise basic case-insensitive matching is used.
+
+        Dialog will not update this value once it has been shown.
+
+        :param use_fuzzy: Whether fuzzy matching is used.
+        :return: None
+        """
+        if not type(use_fuzzy) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(use_fuzzy).__name__)
+        self._use_fuzzy = use_fuzzy
+
     def set_use_regex(self, use_regex):
         """Set whether or not regex terms are used to filter apps.
 
@@ -290,24 +1618,32 @@ class AppChooserButton(Gtk.Button):
     """GTK + 3 Button to open a dialog to select an installed application.
 
     The Gio.AppInfo of the selected app is emitted via the "app_selected"
-    signal once the dialog is closed. 
+    signal once the dialog is closed. The "timing" signal is emitted while
+    timings are collected.
+
+    Optionally, the button keeps a single dialog, which it fills with apps
+    while idle once the button is realized, and then only presents on click.
     """
 
+    __gsignals__ = {
+        "app-selected": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
+        "timing": (GObject.SignalFlags.RUN_FIRST, None, (str, float, int)),
+    }
+
     def __init__(self):
         super().__init__()
 
         self._mime_types = []
+        self._files = []
+        self._file_types = []
         self._filter_term = ""
         self._use_regex = False
+        self._use_fuzzy = False
+        self._use_frecency = False
+        self._timings = None
         self._selected_app = None
-
-        # Register a custom icon_selected signal for once dialog closes.
-        GObject.type_register(AppChooserButton)
-        GObject.signal_new("app-selected",
-                           AppChooserButton,
-                           GObject.SIGNAL_RUN_FIRST,
-                           GObject.TYPE_NONE,
-                           [GObject.TYPE_STRING])
+        self._reuse_dialog = False
+        self._dialog = None
 
         # Widgets go here
         self._icon = Gtk.Image.new_from_icon_name("gtk-search",
@@ -329,32 +1665,149 @@ class AppChooserButton(Gtk.Button):
 
         self.add(box)
         self.connect("clicked", self._show_dialog)
+        self.connect("realize", self._on_realize)
+        self.connect("destroy", self._on_destroy)
 
-    def _show_dialog(self, button):
-        """Called when the button is clicked to show a selection dialog.
+    def _apply_dialog_settings(self, dialog):
+        """Give a dialog the button's MIME types, files and other options.
 
-        :param button: The button used to show the dialog (self)
+        :param dialog: AppChooserDialog to configure.
         :return: None
         """
-        dialog = AppChooserDialog()
         dialog.set_transient_for(self.get_toplevel())
         dialog.set_mime_types(self._mime_types)
+        dialog.set_files(self._files)
         dialog.set_filter_term(self._filter_term)
         dialog.set_use_regex(self._use_regex)
-        self._selected_app = dialog.run()
-        dialog.destroy()
+        dialog.set_use_fuzzy(self._use_fuzzy)
+        dialog.set_use_frecency(self._use_frecency)
+        dialog.set_collect_timings(bool(self._timings))
+
+    def _get_dialog(self):
+        """Get the button's reusable dialog, creating it if necessary.
 
+        :return: AppChooserDialog kept by the button.
+        """
+        if self._dialog is None:
+            self._dialog = AppChooserDialog()
+            self._dialog.set_reusable(True)
+            self._dialog.set_modal(True)
+            self._dialog.get_content_area().show_all()
+            self._dialog.connect("timing", self._on_dialog_timing)
+            self._dialog.connect("response", self._on_dialog_response)
+            self._dialog.connect("delete-event",
+                                 lambda dialog, event: dialog.hide_on_delete())
+        return self._dialog
+
+    def _on_destroy(self, button):
+        """Destroy the reusable dialog along with the button.
+
+        :param button: The button being destroyed (self).
+        :return: None
+        """
+        if self._dialog:
+            self._dialog.destroy()
+            self._dialog = None
+
+    def _on_dialog_response(self, dialog, response):
+        """Take the selection of the reusable dialog once it is closed.
+
+        :param dialog: AppChooserDialog which was closed.
+        :param response: Response ID the dialog was closed with.
+        :return: None
+        """
+        self._set_selected_app(dialog._finish_run(response))
+
+    def _on_files_detected(self, files, content_types):
+        """Store the types of the files set, for iter_apps.
+
+        :param files: List of file paths the types were detected for.
+        :param content_types: List of content types, one per file.
+        :return: None
+        """
+        if files is not self._files:
+            return  # Other files were set while detecting
+        self._file_types = sorted(set(content_types))
+
+    def _on_realize(self, button):
+        """Schedule filling the reusable dialog once the button is realized.
+
+        :param button: The button being realized (self).
+        :return: None
+        """
+        if self._reuse_dialog:
+            GLib.idle_add(self._prewarm_dialog)
+
+    def _prewarm_dialog(self):
+        """Fill the reusable dialog with apps while idle.
+
+        :return: False, so that the idle source is removed.
+        """
+        if self._reuse_dialog and self.get_realized():
+            dialog = self._get_dialog()
+            self._apply_dialog_settings(dialog)
+            dialog.prewarm()
+        return False
+
+    def _set_selected_app(self, app_info):
+        """Show and emit the app chosen in a dialog.
+
+        :param app_info: Gio.AppInfo of the chosen app, or None.
+        :return: None
+        """
+        self._selected_app = app_info
         if self._selected_app:
             app_icon = self._selected_app.get_icon()
             icon_name = app_icon.to_string() if app_icon else \
                 "gtk-missing-icon"
-            self._icon.set_from_icon_name(icon_name, Gtk.IconSize.MENU)
+            _IconCache.get_default().set_image(self._icon, icon_name,
+                                               Gtk.IconSize.MENU)
             self._label.set_text(self._selected_app.get_display_name())
         else:
             self._icon.set_from_icon_name("gtk-search", Gtk.IconSize.MENU)
             self._label.set_text("(Choose An App)")
         self.emit("app_selected", self._selected_app)
 
+    def _show_dialog(self, button):
+        """Called when the button is clicked to show a selection dialog.
+
+        A reusable dialog is only brought up to date and presented, and its
+        selection is taken once it responds.
+
+        :param button: The button used to show the dialog (self)
+        :return: None
+        """
+        if self._reuse_dialog:
+            dialog = self._get_dialog()
+            self._apply_dialog_settings(dialog)
+            dialog._prepare_run()
+            dialog.present()
+            return
+
+        dialog = AppChooserDialog()
+        self._apply_dialog_settings(dialog)
+        dialog.connect("timing", self._on_dialog_timing)
+        self._set_selected_app(dialog.run())
+
+    def _on_dialog_timing(self, dialog, phase, duration, count):
+        """Record timings of the button's dialog as the button's own.
+
+        :param dialog: AppChooserDialog which emitted the timing.
+        :param phase: Name of the phase.
+        :param duration: Time taken in milliseconds.
+        :param count: Number of apps or rows processed.
+        :return: None
+        """
+        if self._timings:
+            self._timings.record(self, phase, duration, count)
+
+    def get_collect_timings(self):
+        """Get whether timings of the button's work are collected.
+
+        :return: Whether timings are collected.
+        """
+        return self._timings is not None
+
     def get_mime_types(self):
         """Get the list of mime types from which to select apps.
 
@@ -362,6 +1815,13 @@ class AppChooserButton(Gtk.Button):
         """
         return self._mime_types
 
+    def get_files(self):
+        """Get the files which listed apps must be able to open.
+
+        :return: List of file paths.
+        """
+        return self._files
+
     def get_filter_term(self):
         """Get the string used for filtering apps by display name.
 
@@ -369,6 +1829,13 @@ class AppChooserButton(Gtk.Button):
         """
         return self._filter_term
 
+    def get_reuse_dialog(self):
+        """Get whether the button keeps a single dialog between clicks.
+
+        :return: Whether the dialog is reused.
+        """
+        return self._reuse_dialog
+
     def get_selected_app(self):
         """Get the Gio.AppInfo of the app selected in the dialog.
         
@@ -378,6 +1845,28 @@ class AppChooserButton(Gtk.Button):
         """
         return self._selected_app
 
+    def get_timings(self):
+        """Get running statistics of the time taken by each phase of work.
+
+        :return: Dictionary mapping phase names to dictionaries of "count",
+                 "p50_ms" and "p95_ms", empty unless timings are collected.
+        """
+        return self._timings.get_stats() if self._timings else {}
+
+    def get_use_frecency(self):
+        """Get whether apps chosen often and recently are listed first.
+
+        :return: Whether apps are ranked by frecency.
+        """
+        return self._use_frecency
+
+    def get_use_fuzzy(self):
+        """Get whether apps are fuzzily matched and ranked by the filter term.
+
+        :return: Whether fuzzy matching is used.
+        """
+        return self._use_fuzzy
+
     def get_use_regex(self):
         """ Get whether the filter term should be used as a regex pattern.
 
@@ -385,6 +1874,45 @@ class AppChooserButton(Gtk.Button):
         """
         return self._use_regex
 
+    def iter_apps(self, limit=None, offset=0):
+        """Yield the apps matching the MIME types and filter term, in order.
+
+        Apps are matched lazily, so taking only the first few does not scan
+        the whole catalog. Files set are matched by the types detected for
+        them in the background, so they restrict no apps until detected. A
+        ValueError is raised on first use if use_regex is True and the filter
+        term is not a valid regex pattern.
+
+        :param limit: Optional maximum number of apps to yield.
+        :param offset: Number of matching apps to skip, for paging.
+        :return: Generator of Gio.AppInfo, best match first when fuzzy
+                 matching, otherwise sorted by display name.
+        """
+        catalog = AppCatalog.get_default()
+        for app_id in catalog.iter_query(self._filter_term, self._mime_types,
+                                         self._use_regex, self._use_fuzzy,
+                                         limit, offset, self._use_frecency,
+                                         self._file_types):
+            yield catalog.get_app_info(app_id)
+
+    def set_collect_timings(self, collect_timings):
+        """Set whether timings of the button's work are collected.
+
+        While enabled, the "timing" signal is emitted with the phase name,
+        its duration in milliseconds and the number of apps or rows processed
+        each time the catalog is loaded ("load") and indexed ("index"), apps
+        are matched ("filter") or rows are updated ("render") by the button's
+        dialog. Enabling collection resets the statistics returned by
+        get_timings.
+
+        :param collect_timings: Whether timings are collected.
+        :return: None
+        """
+        if not type(collect_timings) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(collect_timings).__name__)
+        self._timings = _Timings() if collect_timings else None
+
     def set_mime_types(self, mime_types):
         """ Get the list of mime types from which to select apps.
 
@@ -398,11 +1926,36 @@ class AppChooserButton(Gtk.Button):
                             type(mime_types).__name__)
         self._mime_types = list(set(mime_types))
 
+    def set_files(self, files):
+        """Set the files which listed apps must be able to open, all of them.
+
+        The content types of the files are detected in a worker thread for
+        iter_apps, and again, from the cache, by the button's dialog, see
+        AppChooserDialog.set_files.
+
+        :param files: List of file paths. An empty list lists apps for any
+                      files.
+        :return: None
+        """
+        if not type(files) == list:
+            raise TypeError("must be type list, not " + type(files).__name__)
+        if files == self._files:
+            return
+        files = self._files = list(files)
+        if not files:
+            self._on_files_detected(files, [])
+            return
+        AppCatalog.get_default().get_content_types_async(
+            files, lambda content_types: self._on_files_detected(
+                files, content_types))
+
     def set_filter_term(self, filter_term):
         """Set the string used for filtering apps by display name.
 
         If use_regex is True, the provided string will be used as the pattern
         for a regex match, otherwise basic case-insensitive matching is used.
+        Basic and fuzzy matching also search generic names, keywords,
+        categories and executables, ignoring accents.
 
         Dialog will not update the filter term once it has been shown.
 
@@ -414,6 +1967,59 @@ class AppChooserButton(Gtk.Button):
                             type(filter_term).__name__)
         self._filter_term = filter_term
 
+    def set_reuse_dialog(self, reuse_dialog):
+        """Set whether the button keeps a single dialog between clicks.
+
+        If reuse_dialog is True, the dialog is filled with apps while idle
+        once the button is realized, and is hidden rather than destroyed
+        when closed, so a click only has to present it. The MIME types,
+        filter term and options are applied to it on every click.
+
+        :param reuse_dialog: Whether the dialog is reused.
+        :return: None
+        """
+        if not type(reuse_dialog) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(reuse_dialog).__name__)
+        self._reuse_dialog = reuse_dialog
+        if reuse_dialog and self.get_realized():
+            GLib.idle_add(self._prewarm_dialog)
+        elif not reuse_dialog and self._dialog:
+            self._dialog.destroy()
+            self._dialog = None
+
+    def set_use_frecency(self, use_frecency):
+        """Set whether apps chosen often and recently are listed first.
+
+        If use_frecency is True, apps are listed by their AppUsage score
+        before any others, unless fuzzily ranked by the filter term, and the
+        chosen app is recorded.
+
+        :param use_frecency: Whether apps are ranked by frecency.
+        :return: None
+        """
+        if not type(use_frecency) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(use_frecency).__name__)
+        self._use_frecency = use_frecency
+
+    def set_use_fuzzy(self, use_fuzzy):
+        """Set whether apps are fuzzily matched and ranked by the filter term.
+
+        If use_fuzzy is True and use_regex is False, apps are listed in order
+        of how well their display names match the filter term, tolerating
+        typos, otherwise basic case-insensitive matching is used.
+
+        Dialog will not update this value once it has been shown.
+
+        :param use_fuzzy: Whether fuzzy matching is used.
+        :return: None
+        """
+        if not type(use_fuzzy) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(use_fuzzy).__name__)
+        self._use_fuzzy = use_fuzzy
+
     def set_use_regex(self, use_regex):
         """Set whether or not regex terms are used to filter apps.
 
@@ -435,29 +2041,278 @@ class AppChooserComboBox(Gtk.ComboBox):
     """GTK+ 3 ComboBox allowing selection of an installed application.
     
     The Gio.AppInfo of the currently selected app is made available via the
-    get_selected_app method.
+    get_selected_app method. The "populated" signal is emitted once the combo
+    box has been filled with apps, preceded by "filter-error" if the filter
+    term is not a valid regex pattern. The "timing" signal is emitted while
+    timings are collected.
+
+    Once populated, apps which are installed, removed or changed are added
+    to, removed from or updated in the combo box in place.
+
+    A searchable combo box has an entry, offering the apps whose name or a
+    word in it starts with the text typed, which are found through a prefix
+    index of the catalog rather than by checking every app.
+
+    Only the apps able to open every file set with set_files are listed, once
+    the types of the files have been detected in the background.
     """
 
-    def __init__(self):
-        super().__init__()
+    __gsignals__ = {
+        "filter-error": (GObject.SignalFlags.RUN_FIRST, None, (str,)),
+        "populated": (GObject.SignalFlags.RUN_FIRST, None, ()),
+        "timing": (GObject.SignalFlags.RUN_FIRST, None, (str, float, int)),
+    }
+
+    # Maximum number of apps listed for a fuzzy filter term, and offered for
+    # the text typed into a searchable combo box
+    _FUZZY_LIMIT = 100
+    _SEARCH_LIMIT = 20
+
+    def __init__(self, searchable=False):
+        super().__init__(has_entry=searchable)
 
         self._mime_types = []
+        self._files = []
+        self._file_types = []
         self._filter_term = ""
         self._use_regex = False
-        self._app_list = []
+        self._use_fuzzy = False
+        self._use_frecency = False
+        self._app_ids = []
+        self._app_info_at = None
+        self._app_names = []
+        self._icon_names = []
+        self._slot_apps = []
+        self._shown_apps = set()
+        self._app_ranks = {}
+        self._recorded_app = None
+        self._filter_error = None
+        self._timings = None
+        self._report_load = False
+        self._searchable = searchable
+        self._search_store = None
+
+        # The model is set when populated, and its rows hold the slot of
+        # their app, or -1 for "(Choose An App)"
+        self._pack_app_renderers(self)
+
+        if searchable:
+            # Offered apps are chosen by _on_search_changed, so every row of
+            # the search store is shown by the completion.
+            self._search_store = Gtk.ListStore(int)
+            completion = Gtk.EntryCompletion()
+            completion.set_model(self._search_store)
+            completion.set_match_func(self._is_search_match, None)
+            completion.set_popup_set_width(False)
+            self._pack_app_renderers(completion)
+            completion.connect("match-selected",
+                               self._on_search_match_selected)
+            entry = self.get_child()
+            entry.set_placeholder_text("Search Apps")
+            # Connected before the completion, so matches are found first
+            entry.connect("changed", self._on_search_changed)
+            entry.set_completion(completion)
+            self.connect("format-entry-text", self._format_entry_text)
+
+    def _compare_ranks(self, tree_model, iter_a, iter_b, data):
+        """Sort function ordering fuzzily matched apps by rank.
+
+        :param tree_model: Gtk.TreeModel containing the rows.
+        :param iter_a: Gtk.TreeIter of the first row.
+        :param iter_b: Gtk.TreeIter of the second row.
+        :param data: Unused user data.
+        :return: Negative, zero or positive as the first row sorts before,
+                 with or after the second.
+        """
+        ranks = []
+        for tree_iter in (iter_a, iter_b):
+            slot = tree_model.get_value(tree_iter, 0)
+            ranks += [self._app_ranks.get(self._slot_apps[slot], -1)
+                      if slot >= 0 else -1]
+        return ranks[0] - ranks[1]
+
+    def _filter_shared_store(self, app_store):
+        """Make a view of the shared store holding only the shown apps.
+
+        :param app_store: Gtk.ListStore from _SharedAppStore.
+        :return: Gtk.TreeModelFilter of the store.
+        """
+        app_filter = app_store.filter_new()
+        app_filter.set_visible_func(self._is_app_shown)
+        return app_filter
+
+    def _finish_apps_update(self):
+        """Re-sort ranked apps and keep an app selected after an update.
+
+        :return: None
+        """
+        if self._app_ranks:
+            app_model = self.get_model()
+            app_model.set_sort_column_id(
+                Gtk.TREE_SORTABLE_UNSORTED_SORT_COLUMN_ID,
+                Gtk.SortType.ASCENDING)
+            app_model.set_sort_column_id(0, Gtk.SortType.ASCENDING)
+        if self._searchable:
+            self._search_store.clear()  # Its slots may have been removed
+        elif self.get_active() < 0:
+            self.set_active(0)
+
+    def _format_entry_text(self, combo, path):
+        """Get the text shown in the entry when a row is selected.
+
+        :param combo: The combo box (self).
+        :param path: String path of the selected row.
+        :return: Display name of the row's app, or an empty string.
+        """
+        tree_model = self.get_model()
+        slot = tree_model.get_value(tree_model.get_iter(path), 0)
+        return self._app_names[self._slot_apps[slot]] if slot >= 0 else ""
+
+    def _is_app_shown(self, tree_model, tree_iter, data):
+        """Visible function showing the placeholder and the matching apps.
+
+        :param tree_model: Gtk.ListStore from _SharedAppStore.
+        :param tree_iter: Gtk.TreeIter of the row to check.
+        :param data: Unused user data.
+        :return: Whether the row is shown.
+        """
+        slot = tree_model.get_value(tree_iter, 0)
+        return slot < 0 or self._slot_apps[slot] in self._shown_apps
+
+    def _is_search_match(self, completion, key, tree_iter, data):
+        """Match function showing every app offered by the completion.
+
+        :param completion: Gtk.EntryCompletion of the entry.
+        :param key: Text typed into the entry.
+        :param tree_iter: Gtk.TreeIter of the row to check.
+        :param data: Unused user data.
+        :return: True, as offered apps already match the text typed.
+        """
+        return True
+
+    def _match_apps(self, catalog):
+        """Match apps against the MIME types and filter term.
+
+        :param catalog: AppCatalog to match the apps of.
+        :return: Tuple of a list of the indices of matching apps, in the order
+                 they are listed, and a message describing why the filter
+                 term could not be used, or None.
+        """
+        limit = self._FUZZY_LIMIT if self._use_fuzzy and \
+            normalize_text(self._filter_term) else None
+        try:
+            return catalog.query_indices(
+                self._filter_term, self._mime_types, self._use_regex,
+                self._use_fuzzy, limit, 0, self._use_frecency,
+                self._file_types), None
+        except ValueError as error:
+            return [], str(error)
+
+    def _on_files_detected(self, files, content_types):
+        """Store the types of the files set, populating again if populated.
+
+        :param files: List of file paths the types were detected for.
+        :param content_types: List of content types, one per file.
+        :return: None
+        """
+        if files is not self._files:
+            return  # Other files were set while detecting
+        self._file_types = sorted(set(content_types))
+        if self.get_model() is not None:
+            self.populate()
 
+    def _on_search_changed(self, entry):
+        """Offer the apps matching the text typed into the entry.
+
+        :param entry: Gtk.Entry of the combo box.
+        :return: None
+        """
+        self._search_store.clear()
+        if self.get_active() >= 0 or not self._slot_apps:
+            return  # Text was set for the selected app, or not populated
+        start = time.monotonic()
+        # The shared store's apps, as the catalog may have been reloaded since
+        shared_store = _SharedAppStore.get_default()
+        candidates = self._shown_apps if self._shown_apps or \
+            self._mime_types or self._file_types or self._filter_term \
+            else None
+        app_indices = shared_store.get_prefix_searcher()(
+            entry.get_text(), self._SEARCH_LIMIT, candidates) \
+            if entry.get_text() else []
+        app_slots = shared_store.get_app_slots()
+        for i in app_indices:
+            self._search_store.append([app_slots[i]])
+        if self._timings:
+            self._timings.record(self, "filter",
+                                 (time.monotonic() - start) * 1000,
+                                 len(app_indices))
+
+    def _on_search_match_selected(self, completion, tree_model, tree_iter):
+        """Select the app chosen from those offered by the completion.
+
+        :param completion: Gtk.EntryCompletion of the entry.
+        :param tree_model: Search store of the offered apps.
+        :param tree_iter: Gtk.TreeIter of the chosen app.
+        :return: True, as the entry text is set for the selected row.
+        """
+        slot = tree_model.get_value(tree_iter, 0)
+        shared_store = _SharedAppStore.get_default()
+        app_iter = shared_store.get_slot_iter(slot)
+        # Convert the store's row to the row of the combo box's own view
+        models = []
+        app_model = self.get_model()
+        while isinstance(app_model, (Gtk.TreeModelFilter,
+                                     Gtk.TreeModelSort)):
+            models.insert(0, app_model)
+            app_model = app_model.get_model()
+        for app_model in models:
+            found, app_iter = app_model.convert_child_iter_to_iter(app_iter)
+            if not found:
+                return True
+        self.set_active_iter(app_iter)
+        return True
+
+    def _pack_app_renderers(self, cell_layout):
+        """Pack renderers for the icon and name of apps into a cell layout.
+
+        :param cell_layout: Gtk.CellLayout whose rows hold slots.
+        :return: None
+        """
         pixbuf_renderer = Gtk.CellRendererPixbuf()
         pixbuf_renderer.set_alignment(0, 0.5)
         pixbuf_renderer.set_padding(2, 0)
         text_renderer = Gtk.CellRendererText()
         text_renderer.set_alignment(0, 0.5)
-
-        self._app_store = Gtk.ListStore(str, str)
-        self.set_model(self._app_store)
-        self.pack_start(pixbuf_renderer, True)
-        self.add_attribute(pixbuf_renderer, "icon_name", 0)
-        self.pack_start(text_renderer, True)
-        self.add_attribute(text_renderer, "text", 1)
+        cell_layout.pack_start(pixbuf_renderer, True)
+        cell_layout.set_cell_data_func(pixbuf_renderer, _render_app_icon,
+                                       self)
+        cell_layout.pack_start(text_renderer, True)
+        cell_layout.set_cell_data_func(text_renderer, _render_app_name, self)
+
+    def _update_apps(self, catalog, index_map):
+        """Match apps again after the catalog was reloaded.
+
+        :param catalog: AppCatalog which has been reloaded.
+        :param index_map: Dictionary mapping the previous indices of kept
+                          apps to their new indices.
+        :return: Set of new indices of kept apps which are now shown or
+                 hidden, and so need their rows checked again.
+        """
+        self._app_ids = catalog.get_app_ids()
+        self._app_info_at = catalog.get_app_info_getter()
+        self._app_names = catalog.get_display_names()
+        self._icon_names = catalog.get_icon_names()
+        if not self._mime_types and not self._file_types and \
+                not self._filter_term and not self._app_ranks:
+            return set()  # The shared store is shown as it is
+
+        old_shown_apps = {index_map[i] for i in self._shown_apps
+                          if i in index_map}
+        app_indices, self._filter_error = self._match_apps(catalog)
+        self._shown_apps = set(app_indices)
+        if self._app_ranks:
+            self._app_ranks = {i: rank for rank, i in enumerate(app_indices)}
+        return old_shown_apps ^ self._shown_apps
 
     def get_mime_types(self):
         """Get the list of mime types from which to select apps.
@@ -466,6 +2321,13 @@ class AppChooserComboBox(Gtk.ComboBox):
         """
         return self._mime_types
 
+    def get_files(self):
+        """Get the files which listed apps must be able to open.
+
+        :return: List of file paths.
+        """
+        return self._files
+
     def get_filter_term(self):
         """Get the string used for filtering apps by display name.
         
@@ -473,16 +2335,65 @@ class AppChooserComboBox(Gtk.ComboBox):
         """
         return self._filter_term
 
+    def get_collect_timings(self):
+        """Get whether timings of the combo box's work are collected.
+
+        :return: Whether timings are collected.
+        """
+        return self._timings is not None
+
+    def get_filter_error(self):
+        """Get why the filter term could not be used when last populated.
+
+        :return: Message describing the problem, or None.
+        """
+        return self._filter_error
+
     def get_selected_app(self):
         """Get the Gio.AppInfo of the app currently selected in the combo box.
         
         :return: Gio.AppInfo of currently selected app.
         """
-        selection_index = self.get_active()
-        if selection_index == 0:  # When "Choose An App)" is selected
+        tree_iter = self.get_active_iter()
+        slot = self.get_model().get_value(tree_iter, 0) if tree_iter else -1
+        if slot < 0:  # When "(Choose An App)" is selected
             return None
-        else:
-            return self._app_list[selection_index - 1]
+        app_index = self._slot_apps[slot]
+        app_id = self._app_ids[app_index]
+        if self._use_frecency and app_id != self._recorded_app:
+            # Each choice is recorded once, however often it is asked for
+            self._recorded_app = app_id
+            AppUsage.get_default().record(app_id)
+        return _get_app_info(self._app_ids, self._app_info_at, app_index)
+
+    def get_searchable(self):
+        """Get whether the combo box has an entry to search for apps.
+
+        :return: Whether the combo box is searchable.
+        """
+        return self._searchable
+
+    def get_timings(self):
+        """Get running statistics of the time taken by each phase of work.
+
+        :return: Dictionary mapping phase names to dictionaries of "count",
+                 "p50_ms" and "p95_ms", empty unless timings are collected.
+        """
+        return self._timings.get_stats() if self._timings else {}
+
+    def get_use_frecency(self):
+        """Get whether apps chosen often and recently are listed first.
+
+        :return: Whether apps are ranked by frecency.
+        """
+        return self._use_frecency
+
+    def get_use_fuzzy(self):
+        """Get whether apps are fuzzily matched and ranked by the filter term.
+
+        :return: Whether fuzzy matching is used.
+        """
+        return self._use_fuzzy
 
     def get_use_regex(self):
         """ Get whether the filter term should be used as a regex pattern.
@@ -491,53 +2402,127 @@ class AppChooserComboBox(Gtk.ComboBox):
         """
         return self._use_regex
 
+    def iter_apps(self, limit=None, offset=0):
+        """Yield the apps matching the MIME types and filter term, in order.
+
+        Apps are matched lazily, so taking only the first few does not scan
+        the whole catalog. Files set are matched by the types detected for
+        them in the background, so they restrict no apps until detected. A
+        ValueError is raised on first use if use_regex is True and the filter
+        term is not a valid regex pattern.
+
+        :param limit: Optional maximum number of apps to yield.
+        :param offset: Number of matching apps to skip, for paging.
+        :return: Generator of Gio.AppInfo, best match first when fuzzy
+                 matching, otherwise sorted by display name.
+        """
+        catalog = AppCatalog.get_default()
+        for app_id in catalog.iter_query(self._filter_term, self._mime_types,
+                                         self._use_regex, self._use_fuzzy,
+                                         limit, offset, self._use_frecency,
+                                         self._file_types):
+            yield catalog.get_app_info(app_id)
+
     def populate(self):
         """Populate the combo box with installed applications.
+
+        Combo boxes share a single model of every installed app, and each
+        shows only the apps matching its MIME types and filter term through
+        a view of that model, so many combo boxes cost little more than one.
         
         :return: None
         """
-        app_list = Gio.AppInfo.get_all()
-        self._app_list = []
-
-        for app in app_list:
-            if self._filter_term:
-                if self._use_regex:
-                    if not re.search(self._filter_term,
-                                     app.get_display_name()):
-                        continue
-                else:
-                    if not self._filter_term.lower() in \
-                            app.get_display_name().lower():
-                        continue
-
-            if self._mime_types:
-                supported_types_specific = app.get_supported_types()
-                supported_types_general = []
-                for mime_type in supported_types_specific:
-                    mime_type = mime_type.split('/')
-                    if mime_type[0] not in supported_types_general:
-                        supported_types_general += [mime_type[0]]
-                no_match = True
-                for mime_type in self._mime_types:
-                    if mime_type in supported_types_general or \
-                                    mime_type in supported_types_specific:
-                        no_match = False
-                        break
-                if no_match:
-                    continue
-
-            self._app_list += [app]
-
-        self._app_list.sort(key=lambda app: app.get_display_name())
-
-        self._app_store.clear()
-        self._app_store.append(["gtk-search", "(Choose An App)"])
-        for app in self._app_list:
-            icon = app.get_icon()
-            icon_name = icon.to_string() if icon else "gtk-missing-icon"
-            self._app_store.append([icon_name, app.get_display_name()])
+        catalog = AppCatalog.get_default()
+        if not catalog.is_loaded():
+            self._report_load = True
+        self._app_ids = catalog.get_app_ids()
+        self._app_info_at = catalog.get_app_info_getter()
+        self._app_names = catalog.get_display_names()
+        self._icon_names = catalog.get_icon_names()
+        if self._timings and self._report_load:
+            self._timings.record_catalog_load(self, catalog)
+        self._report_load = False
+
+        start = time.monotonic()
+        app_indices, self._filter_error = self._match_apps(catalog)
+        if self._timings:
+            candidates = catalog.get_type_matches(self._mime_types,
+                                                  self._file_types)
+            candidate_count = len(self._app_ids) if candidates is None \
+                else len(candidates)
+            self._timings.record(self, "filter",
+                                 (time.monotonic() - start) * 1000,
+                                 candidate_count)
+
+        start = time.monotonic()
+        shared_store = _SharedAppStore.get_default()
+        app_store = shared_store.get_store(catalog)
+        self._slot_apps = shared_store.get_slot_apps()
+        self._shown_apps = set(app_indices)
+        self._app_ranks = {}
+        ranked = bool(normalize_text(self._filter_term)) and \
+            self._use_fuzzy and not self._use_regex
+        if self._use_frecency and not ranked:
+            ranked = bool(catalog.get_used_apps(self._shown_apps))
+        if ranked:
+            # Ranked apps are sorted by rank rather than by name
+            self._app_ranks = {i: rank for rank, i in enumerate(app_indices)}
+            app_model = Gtk.TreeModelSort(model=self._filter_shared_store(
+                app_store))
+            app_model.set_sort_func(0, self._compare_ranks)
+            app_model.set_sort_column_id(0, Gtk.SortType.ASCENDING)
+        elif self._mime_types or self._file_types or self._filter_term:
+            app_model = self._filter_shared_store(app_store)
+        else:
+            self._shown_apps = set()
+            app_model = app_store
+        self.set_model(app_model)
+        shared_store.add_combo(self)
+        if self._timings:
+            self._timings.record(self, "render",
+                                 (time.monotonic() - start) * 1000,
+                                 len(app_indices))
         self.set_active(0)
         self.show_all()
+        if self._filter_error:
+            self.emit("filter-error", self._filter_error)
+        self.emit("populated")
+
+    def populate_async(self, callback=None):
+        """Populate the combo box once apps are loaded in a worker thread.
+
+        The "populated" signal is emitted once the combo box has been filled.
+
+        :param callback: Optional function to call with the combo box once it
+                         has been populated.
+        :return: None
+        """
+        def on_catalog_loaded(catalog):
+            self.populate()
+            if callback:
+                callback(self)
+
+        catalog = AppCatalog.get_default()
+        if not catalog.is_loaded():
+            self._report_load = True
+        catalog.load_async(on_catalog_loaded)
+
+    def set_collect_timings(self, collect_timings):
+        """Set whether timings of the combo box's work are collected.
+
+        While enabled, the "timing" signal is emitted with the phase name,
+        its duration in milliseconds and the number of apps or rows processed
+        each time the catalog is loaded ("load") and indexed ("index"), apps
+        are matched ("filter") or rows are updated ("render"). Enabling
+        collection resets the statistics returned by get_timings.
+
+        :param collect_timings: Whether timings are collected.
+        :return: None
+        """
+        if not type(collect_timings) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(collect_timings).__name__)
+        self._timings = _Timings() if collect_timings else None
 
     def set_mime_types(self, mime_types):
         """ Get the list of mime types from which to select apps.
@@ -552,11 +2537,36 @@ class AppChooserComboBox(Gtk.ComboBox):
                             type(mime_types).__name__)
         self._mime_types = list(set(mime_types))
 
+    def set_files(self, files):
+        """Set the files which listed apps must be able to open, all of them.
+
+        The content types of the files are detected in a worker thread, see
+        AppCatalog.get_content_types, and a populated combo box is populated
+        again once they are.
+
+        :param files: List of file paths. An empty list lists apps for any
+                      files.
+        :return: None
+        """
+        if not type(files) == list:
+            raise TypeError("must be type list, not " + type(files).__name__)
+        if files == self._files:
+            return
+        files = self._files = list(files)
+        if not files:
+            self._on_files_detected(files, [])
+            return
+        AppCatalog.get_default().get_content_types_async(
+            files, lambda content_types: self._on_files_detected(
+                files, content_types))
+
     def set_filter_term(self, filter_term):
         """Set the string used for filtering apps by display name.
         
         If use_regex is True, the provided string will be used as the pattern
         for a regex match, otherwise basic case-insensitive matching is used.
+        Basic and fuzzy matching also search generic names, keywords,
+        categories and executables, ignoring accents.
         
         Combobox will not update the filter term once it has been shown.
         
@@ -568,6 +2578,38 @@ class AppChooserComboBox(Gtk.ComboBox):
                             type(filter_term).__name__)
         self._filter_term = filter_term
 
+    def set_use_frecency(self, use_frecency):
+        """Set whether apps chosen often and recently are listed first.
+
+        If use_frecency is True, apps are listed by their AppUsage score
+        before any others, unless fuzzily ranked by the filter term, and the
+        chosen app is recorded.
+
+        :param use_frecency: Whether apps are ranked by frecency.
+        :return: None
+        """
+        if not type(use_frecency) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(use_frecency).__name__)
+        self._use_frecency = use_frecency
+
+    def set_use_fuzzy(self, use_fuzzy):
+        """Set whether apps are fuzzily matched and ranked by the filter term.
+
+        If use_fuzzy is True and use_regex is False, apps are listed in order
+        of how well their display names match the filter term, tolerating
+        typos, otherwise basic case-insensitive matching is used.
+
+        Combobox will not update this value once it has been shown.
+
+        :param use_fuzzy: Whether fuzzy matching is used.
+        :return: None
+        """
+        if not type(use_fuzzy) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(use_fuzzy).__name__)
+        self._use_fuzzy = use_fuzzy
+
     def set_use_regex(self, use_regex):
         """Set whether or not regex terms are used to filter apps.
         
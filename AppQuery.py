@@ -0,0 +1,1777 @@
+# Copyright (C) 2017 Tom Hartill
+#
+# AppQuery.py - Catalog of installed applications and queries over it, for use
+# with or without the widgets provided by AppChooser.
+#
+# AppChooser is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# AppChooser is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# AppChooser; if not, see http://www.gnu.org/licenses/.
+#
+# An up to date version can be found at:
+# https://github.com/Tomha/python-gtk-app-chooser
+
+# Gio and GLib are imported where they are first needed, and Gtk never is, so
+# that importing this module stays cheap for code without a user interface.
+
+import array
+import bisect
+import collections
+import concurrent.futures
+import functools
+import heapq
+import itertools
+import locale
+import marshal
+import math
+import mmap
+import os
+import re
+import shlex
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+
+
+# Scores given to matches in fields other than the display name, which is
+# scored by _fuzzy_score, in the order the fields are joined in search texts.
+_FIELD_WEIGHTS = {
+    "generic_name": 1.2,
+    "keywords": 1.1,
+    "executable": 1.0,
+    "categories": 0.8,
+}
+
+
+# Trigrams found in more than this share of names are too common to be worth
+# counting when fuzzy matching, much like stop words, and at least this many
+# apps sharing the most trigrams with a term have their names scored.
+_COMMON_TRIGRAM_SHARE = 0.25
+_FUZZY_CANDIDATES = 200
+
+
+# Keys of the [Desktop Entry] group read by the desktop file scanner, and the
+# number of desktop files parsed by each task of its thread pool
+_DESKTOP_KEYS = {"Categories", "Exec", "GenericName", "Hidden", "Icon",
+                 "Keywords", "MimeType", "Name", "TryExec", "Type",
+                 "X-GNOME-FullName"}
+_SCAN_CHUNK = 64
+
+
+# Number of files whose content types are detected by each task of a pool
+_DETECT_CHUNK = 32
+
+
+# Bumped whenever the contents of a catalog snapshot change
+_SNAPSHOT_VERSION = 6
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_pattern(pattern):
+    """Compile a regex filter term, caching the result.
+
+    :param pattern: Regex pattern to compile.
+    :return: Tuple of the compiled pattern, or None if the pattern is invalid,
+             and an error message, or None if the pattern is valid.
+    """
+    try:
+        return re.compile(pattern), None
+    except re.error as error:
+        return None, str(error)
+
+
+def _detect_content_types(paths, cached):
+    """Detect the content types of files, reusing those cached for them.
+
+    A file's type is guessed from its name, and from its contents where the
+    name is ambiguous, and a cached type is reused while the file's
+    modification time is unchanged. Files which cannot be read are typed by
+    their names alone.
+
+    :param paths: List of file paths.
+    :param cached: Dictionary mapping paths to tuples of modification times,
+                   in nanoseconds, and content types, which is only read.
+    :return: List of tuples of modification times and content types, one
+             per path, with None for the times of files which were not read.
+    """
+    from gi.repository import Gio, GLib
+    detected = []
+    for path in paths:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            detected += [(None, Gio.content_type_guess(path, None)[0])]
+            continue
+        entry = cached.get(path)
+        if entry is not None and entry[0] == mtime:
+            detected += [entry]
+            continue
+        try:
+            content_type = Gio.File.new_for_path(path).query_info(
+                Gio.FILE_ATTRIBUTE_STANDARD_CONTENT_TYPE,
+                Gio.FileQueryInfoFlags.NONE, None).get_content_type()
+        except GLib.Error:
+            content_type = None
+        if not content_type:
+            detected += [(None, Gio.content_type_guess(path, None)[0])]
+            continue
+        detected += [(mtime, content_type)]
+    return detected
+
+
+def _find_desktop_files(dir_path, id_prefix, desktop_files):
+    """Find the desktop files under an application directory.
+
+    Desktop file IDs are their paths relative to the application directory,
+    with "/" replaced by "-". IDs already found are kept, so directories must
+    be searched in order of precedence, and earlier files shadow later ones.
+
+    :param dir_path: Path of the directory to search.
+    :param id_prefix: Prefix of the IDs of desktop files in the directory.
+    :param desktop_files: Dictionary mapping desktop file IDs to paths, which
+                          found files are added to.
+    :return: None
+    """
+    try:
+        entries = list(os.scandir(dir_path))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                _find_desktop_files(entry.path, id_prefix + entry.name + "-",
+                                    desktop_files)
+            elif entry.name.endswith(".desktop"):
+                desktop_files.setdefault(id_prefix + entry.name, entry.path)
+        except OSError:
+            pass
+
+
+@functools.lru_cache(maxsize=None)
+def _find_program(program):
+    """Find a program in the PATH, caching the result for a scan.
+
+    :param program: Program name or path.
+    :return: Path of the program, or None if it is not installed.
+    """
+    return shutil.which(program)
+
+
+def _find_word_breaks(text):
+    """Find the spaces which are followed by the start of a word.
+
+    :param text: String to search.
+    :return: List of the positions of the spaces.
+    """
+    return [match.start() for match in re.finditer(r" (?=\S)", text)]
+
+
+def _fuzzy_score(term, name, shared, term_grams, name_grams):
+    """Score how well a name matches a fuzzy filter term, higher is better.
+
+    The trigram similarity of the two strings is boosted when the term is a
+    prefix of the name, starts at a word boundary, or at least appears in
+    order with few gaps between its characters.
+
+    :param term: Normalized filter term.
+    :param name: Normalized display name.
+    :param shared: Number of trigrams shared by term and name.
+    :param term_grams: Number of trigrams in the term.
+    :param name_grams: Number of trigrams in the name.
+    :return: Score of the match.
+    """
+    score = 2 * shared / (term_grams + name_grams)
+    position = name.find(term)
+    if position == 0:
+        score += 1
+    elif position > 0:
+        score += 0.5 if name[position - 1].isalnum() else 0.75
+    else:
+        gaps = 0
+        last = -1
+        for char in term:
+            found = name.find(char, last + 1)
+            if found < 0:
+                break
+            if last >= 0:
+                gaps += found - last - 1
+            last = found
+        else:
+            score += max(0, 0.4 - 0.05 * gaps)
+    return score
+
+
+def _get_icon_name(app):
+    """Get the name of an app's icon, or of a stand-in for apps without one.
+
+    :param app: Gio.AppInfo or _DesktopEntry to read the icon of.
+    :return: Icon name, or the string form of a Gio.Icon.
+    """
+    if isinstance(app, _DesktopEntry):
+        return app.icon_name or "gtk-missing-icon"
+    icon = app.get_icon()
+    return icon.to_string() if icon else "gtk-missing-icon"
+
+
+def _get_search_fields(app):
+    """Get the normalized text of the fields searched besides the name.
+
+    :param app: Gio.AppInfo to read fields from.
+    :return: List of normalized texts in the order of _FIELD_WEIGHTS, empty
+             for missing fields.
+    """
+    fields = {"executable": os.path.basename(app.get_executable() or "")}
+    if hasattr(app, "get_keywords"):  # Only Gio.DesktopAppInfo has these
+        fields["generic_name"] = app.get_generic_name() or ""
+        fields["keywords"] = " ".join(app.get_keywords() or [])
+        fields["categories"] = (app.get_categories() or "").replace(';', ' ')
+    return [normalize_text(fields.get(field, "")) for field in _FIELD_WEIGHTS]
+
+
+def _get_snapshot_path():
+    """Get the path at which catalog snapshots are saved.
+
+    :return: Path of the snapshot file under the user's cache directory.
+    """
+    from gi.repository import GLib
+    return os.path.join(GLib.get_user_cache_dir(), "AppChooser",
+                        "catalog.marshal")
+
+
+def _get_snapshot_signature():
+    """Describe the state which a catalog snapshot was taken from.
+
+    Desktop files are added, removed or replaced by renaming, so the
+    modification times of the application directories change along with the
+    installed apps. Display names are localized and apps are sorted by
+    collation keys, so the locale is included.
+
+    :return: Tuple which differs whenever a snapshot would be out of date.
+    """
+    from gi.repository import GLib
+    data_dirs = [GLib.get_user_data_dir()] + GLib.get_system_data_dirs()
+    dir_mtimes = []
+    for data_dir in data_dirs:
+        for dir_path, dir_names, file_names in os.walk(
+                os.path.join(data_dir, "applications")):
+            try:
+                dir_mtimes += [(dir_path, os.stat(dir_path).st_mtime_ns)]
+            except OSError:
+                pass
+    return tuple(GLib.get_language_names()), \
+        locale.setlocale(locale.LC_COLLATE), tuple(dir_mtimes)
+
+
+def normalize_text(text):
+    """Casefold text and strip accents, so that "Écran" matches "ecran".
+
+    :param text: String to normalize.
+    :return: Normalized string.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed
+                   if not unicodedata.combining(char))
+
+
+def _prime_app_monitor():
+    """Read installed apps through Gio without holding up the caller.
+
+    Gio.AppInfoMonitor only reports changes once apps have been read through
+    Gio, which catalogs loaded some other way must do in the background.
+
+    :return: None
+    """
+    from gi.repository import Gio
+    threading.Thread(target=Gio.AppInfo.get_all, daemon=True).start()
+
+
+def _read_desktop_files(desktop_files, languages):
+    """Parse desktop files, keeping only the apps Gio.AppInfo.get_all lists.
+
+    Only the keys in _DESKTOP_KEYS are kept. Apps which are hidden, are not
+    of type Application, or whose TryExec program is missing are dropped.
+
+    :param desktop_files: List of tuples of desktop file IDs and paths.
+    :param languages: Language names to localize strings for, most preferred
+                      first, as returned by GLib.get_language_names.
+    :return: List of _DesktopEntry.
+    """
+    entries = []
+    for desktop_id, path in desktop_files:
+        try:
+            with open(path, encoding="utf-8", errors="replace") as entry_file:
+                lines = entry_file.read().splitlines()
+        except OSError:
+            continue
+
+        values = {}
+        localized = False
+        in_group = False
+        for line in lines:
+            if line.startswith("["):
+                if in_group:
+                    break
+                in_group = line.rstrip() == "[Desktop Entry]"
+            elif in_group and "=" in line and not line.startswith("#"):
+                key, value = line.split("=", 1)
+                key = key.strip()
+                base_key, bracket, _ = key.partition("[")
+                if base_key in _DESKTOP_KEYS:
+                    values[key] = value.strip()
+                    localized = localized or bool(bracket)
+
+        def get_value(key):
+            for language in languages if localized else ():
+                value = values.get("{0}[{1}]".format(key, language))
+                if value is not None:
+                    return value
+            return values.get(key)
+
+        def get_string(key):
+            value = get_value(key)
+            return _unescape(value) if value is not None else None
+
+        def get_list(key):
+            value = get_value(key)
+            return [_unescape(item) for item in
+                    re.split(r"(?<!\\);", value) if item] if value else []
+
+        try_exec = get_string("TryExec")
+        if values.get("Type") != "Application" or \
+                values.get("Hidden") == "true" or \
+                (try_exec and not _find_program(try_exec)) or \
+                get_string("Name") is None:
+            continue
+
+        # Like Gio, drop apps whose program is not installed
+        executable = ""
+        exec_line = get_string("Exec")
+        if exec_line:
+            try:
+                executable = shlex.split(exec_line)[0] \
+                    if any(char in exec_line for char in "\"'\\") \
+                    else exec_line.split()[0]
+            except (ValueError, IndexError):
+                pass
+            if executable and not _find_program(executable):
+                continue
+
+        entries += [_DesktopEntry(
+            desktop_id, get_string("X-GNOME-FullName") or get_string("Name"),
+            get_string("Icon"), get_list("MimeType"), executable,
+            get_string("GenericName"), get_list("Keywords"),
+            get_string("Categories"))]
+    return entries
+
+
+def _scan_desktop_files():
+    """Find and parse the desktop files of installed apps in a thread pool.
+
+    Application directories are searched in XDG order of precedence, so a
+    desktop file shadows any with the same ID in later directories, even
+    when it is hidden. Only the desktop files which are not shadowed are
+    parsed, in chunks spread over a pool of threads which overlap reading
+    files with parsing them.
+
+    :return: List of _DesktopEntry, in no particular order.
+    """
+    from gi.repository import GLib
+    _find_program.cache_clear()
+    data_dirs = [GLib.get_user_data_dir()] + GLib.get_system_data_dirs()
+    desktop_files = {}
+    for data_dir in data_dirs:
+        _find_desktop_files(os.path.join(data_dir, "applications"), "",
+                            desktop_files)
+
+    desktop_files = list(desktop_files.items())
+    languages = GLib.get_language_names()
+    entries = []
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        for chunk_entries in executor.map(
+                _read_desktop_files,
+                [desktop_files[start:start + _SCAN_CHUNK]
+                 for start in range(0, len(desktop_files), _SCAN_CHUNK)],
+                itertools.repeat(languages)):
+            entries += chunk_entries
+    return entries
+
+
+def _trigrams(text):
+    """Get the set of trigrams in a string, padded to mark word starts.
+
+    Each word is padded on its own, so that a single letter term matches
+    the start of any word, as in "Image Viewer" for "v".
+
+    :param text: String to split.
+    :return: Set of three character strings.
+    """
+    grams = set()
+    for word in text.split():
+        padded = "  " + word + " "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _unescape(value):
+    """Replace the escape sequences of a desktop file string value.
+
+    :param value: Value as written in the desktop file.
+    :return: Unescaped string.
+    """
+    if "\\" not in value:
+        return value
+    return re.sub(r"\\(.)", lambda match: {
+        "s": " ", "n": "\n", "t": "\t", "r": "\r", "\\": "\\", ";": ";"
+    }.get(match.group(1), match.group(0)), value)
+
+
+def _unpack_array(packed):
+    """Rebuild an array of unsigned ints from the bytes saved in a snapshot.
+
+    :param packed: Bytes returned by array.tobytes.
+    :return: array.array of typecode "I".
+    """
+    values = array.array("I")
+    values.frombytes(packed)
+    return values
+
+
+class _CatalogData:
+    """Installed apps and lookup tables from a single load of the catalog.
+
+    Built in full, either from Gio.AppInfo objects or from a snapshot saved by
+    an earlier process, before being handed to the catalog. Only the cache of
+    Gio.AppInfo objects, which are created on demand from app IDs, changes
+    afterwards, so it may be built in one thread and read in another.
+
+    Apps are records spread over parallel lists, one entry per app in display
+    name order, and index lists are arrays of unsigned ints rather than lists
+    of Python ints. No Gio objects are kept, except for apps without IDs.
+
+    The MIME type closures cached by get_mime_keys also change, but only
+    gain entries which are the same whichever thread computes them.
+    """
+
+    # Attributes saved in snapshots, which hold everything but Gio objects
+    _SNAPSHOT_FIELDS = ("ids", "names", "collation_keys", "icon_names",
+                        "folded_names", "search_texts", "mime_index",
+                        "trigram_index", "trigram_counts", "field_index")
+    # Snapshot fields which hold an array, or a dictionary of arrays, as
+    # marshal only saves their bytes
+    _ARRAY_FIELDS = ("trigram_counts",)
+    _ARRAY_MAP_FIELDS = ("mime_index", "trigram_index", "field_index")
+
+    def __init__(self, apps):
+        from gi.repository import GLib
+        self.load_ms = 0
+        self.index_ms = 0
+
+        # Sort by collation keys, computed once per app, so that names are in
+        # the order the locale expects rather than in code point order.
+        names = [app.get_display_name() for app in apps]
+        keys = [GLib.utf8_collate_key(name, -1) for name in names]
+        order = sorted(range(len(apps)), key=lambda i: (keys[i], names[i]))
+        apps = [apps[i] for i in order]
+        self.names = [names[i] for i in order]
+        self.collation_keys = [keys[i] for i in order]
+
+        # Extract row data once so filtering never calls back into Gio. Icon
+        # names are shared by many apps, so are interned.
+        self.ids = [app.get_id() for app in apps]
+        self.folded_names = [normalize_text(name) for name in self.names]
+        self.icon_names = []
+        for app in apps:
+            self.icon_names += [sys.intern(_get_icon_name(app))]
+
+        # Other apps are recreated from their IDs when first requested.
+        self.apps = {i: app for i, app in enumerate(apps)
+                     if self.ids[i] is None}
+
+        # Map every full and major MIME type to the ascending indices of its
+        # handlers, so that handlers of several types can be merged lazily.
+        self.mime_index = {}
+        for i, app in enumerate(apps):
+            for mime_type in app.get_supported_types() or []:
+                major_type = mime_type.split('/')[0]
+                for key in {mime_type, major_type}:
+                    handlers = self.mime_index.setdefault(key, array.array(
+                        "I"))
+                    if not handlers or handlers[-1] != i:
+                        handlers.append(i)
+
+        # Normalize every searched field once, and join them so that basic
+        # matching is a single substring test per app. Fuzzy matching finds
+        # the apps whose other fields contain the term through an index of
+        # the characters and trigrams of each field, keyed by the field's
+        # position in _FIELD_WEIGHTS followed by the character or trigram.
+        self.search_texts = []
+        text_apps = collections.defaultdict(list)
+        for i, (name, app) in enumerate(zip(self.folded_names, apps)):
+            fields = _get_search_fields(app)
+            self.search_texts += ["\n".join([name] + fields)]
+            for field, text in enumerate(fields):
+                text_apps[field, text].append(i)
+        # Field texts are often shared by many apps, so each distinct text is
+        # split once, and its apps added to the postings of all its keys.
+        self.field_index = collections.defaultdict(lambda: array.array("I"))
+        for (field, text), text_indices in text_apps.items():
+            grams = set(text)
+            grams.update(text[start:start + 3]
+                         for start in range(len(text) - 2))
+            for gram in grams:
+                self.field_index[str(field) + gram].extend(text_indices)
+        self.field_index = {key: array.array("I", sorted(postings))
+                            for key, postings in self.field_index.items()}
+
+        # Map every trigram of the normalized names to the apps containing it.
+        self.trigram_index = {}
+        self.trigram_counts = array.array("I")
+        for i, name in enumerate(self.folded_names):
+            grams = _trigrams(name)
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                postings = self.trigram_index.get(gram)
+                if postings is None:
+                    postings = self.trigram_index[gram] = array.array("I")
+                postings.append(i)
+
+        self.id_index = {app_id: i for i, app_id in enumerate(self.ids)
+                         if app_id is not None}
+        self.mime_closures = {}
+        self._index_prefixes()
+
+    @classmethod
+    def load_snapshot(cls, path, signature):
+        """Load catalog data saved by save_snapshot, if it is still current.
+
+        The file is memory mapped and unmarshalled, and only index arrays are
+        rebuilt from their bytes. No Gio.AppInfo objects are created.
+
+        :param path: Path of the snapshot file.
+        :param signature: Current value of _get_snapshot_signature.
+        :return: _CatalogData, or None if the snapshot is missing or stale.
+        """
+        try:
+            with open(path, "rb") as snapshot_file, \
+                    mmap.mmap(snapshot_file.fileno(), 0,
+                              access=mmap.ACCESS_READ) as snapshot_map:
+                snapshot = marshal.loads(snapshot_map)
+        except (OSError, ValueError, EOFError, TypeError):
+            return None
+        if not isinstance(snapshot, tuple) or \
+                len(snapshot) != 3 + len(cls._SNAPSHOT_FIELDS) or \
+                snapshot[:3] != (_SNAPSHOT_VERSION, marshal.version,
+                                 signature):
+            return None
+
+        data = cls.__new__(cls)
+        data.load_ms = 0
+        data.index_ms = 0
+        for field, value in zip(cls._SNAPSHOT_FIELDS, snapshot[3:]):
+            if field in cls._ARRAY_FIELDS:
+                value = _unpack_array(value)
+            elif field in cls._ARRAY_MAP_FIELDS:
+                value = {key: _unpack_array(packed)
+                         for key, packed in value.items()}
+            setattr(data, field, value)
+        data.apps = {}
+        data.id_index = {app_id: i for i, app_id in enumerate(data.ids)}
+        data.mime_closures = {}
+        data._index_prefixes()
+        return data
+
+    def _index_prefixes(self):
+        """Sort the normalized names, and the words within them, for searches.
+
+        Names are sorted along with their app indices, as is the remainder of
+        each name from the start of every later word, so that a binary search
+        finds the apps with a name or word starting with a term.
+
+        :return: None
+        """
+        name_keys = sorted(zip(self.folded_names, range(len(self.ids))))
+        word_keys = sorted((name[start + 1:], i)
+                           for i, name in enumerate(self.folded_names)
+                           for start in _find_word_breaks(name))
+        self.name_keys = [key for key, i in name_keys]
+        self.name_apps = array.array("I", (i for key, i in name_keys))
+        self.word_keys = [key for key, i in word_keys]
+        self.word_apps = array.array("I", (i for key, i in word_keys))
+
+    def get_app_info(self, i):
+        """Get the Gio.AppInfo of an app, creating it if necessary.
+
+        :param i: Index of the app.
+        :return: Gio.AppInfo of the app, or None if it no longer exists.
+        """
+        app = self.apps.get(i)
+        if app is None:
+            from gi.repository import Gio
+            app = self.apps[i] = Gio.DesktopAppInfo.new(self.ids[i])
+        return app
+
+    def get_mime_keys(self, mime_types):
+        """Get the keys of the MIME index which any of the given types are.
+
+        A full MIME type is each type it is a subclass or an alias of, as
+        decided by Gio.content_type_is_a, so "text/x-python" matches apps
+        supporting "text/plain". Every type but directories is also a
+        subclass of "application/octet-stream", which only matches when
+        requested itself, so that apps for any data are not always listed.
+        Only keys of the index are checked, once per set of requested types,
+        and the result is cached so that later lookups cost no more than
+        exact matching. A major type only matches itself.
+
+        :param mime_types: List of MIME types to look up.
+        :return: Tuple of keys of mime_index.
+        """
+        requested = frozenset(mime_types)
+        keys = self.mime_closures.get(requested)
+        if keys is None:
+            from gi.repository import Gio
+            keys = set()
+            for mime_type in requested:
+                if mime_type in self.mime_index:
+                    keys.add(mime_type)
+                if "/" in mime_type:
+                    keys.update(key for key in self.mime_index if "/" in key
+                                and key != "application/octet-stream"
+                                and Gio.content_type_is_a(mime_type, key))
+            keys = self.mime_closures[requested] = tuple(sorted(keys))
+        return keys
+
+    def iter_mime_matches(self, mime_types):
+        """Yield the indices of apps supporting any of the given MIME types.
+
+        :param mime_types: List of MIME types to look up, see get_mime_keys.
+        :return: Generator of app indices in ascending order.
+        """
+        last = None
+        for i in heapq.merge(*[self.mime_index[key]
+                               for key in self.get_mime_keys(mime_types)]):
+            if i != last:
+                yield i
+            last = i
+
+    def prefix_search(self, folded_term, limit, candidates=None):
+        """Find apps whose name, or a word in it, starts with a term.
+
+        Apps whose name starts with the term come first, in name order, then
+        those with a later word starting with it. Each index is searched by
+        bisection, and only keys starting with the term are visited until
+        limit apps are found.
+
+        :param folded_term: Normalized filter term.
+        :param limit: Maximum number of apps to return.
+        :param candidates: Optional set of app indices to search within.
+        :return: List of app indices.
+        """
+        found = []
+        found_set = set()
+        for keys, apps in ((self.name_keys, self.name_apps),
+                           (self.word_keys, self.word_apps)):
+            position = bisect.bisect_left(keys, folded_term)
+            while position < len(keys) and len(found) < limit and \
+                    keys[position].startswith(folded_term):
+                i = apps[position]
+                if (candidates is None or i in candidates) and \
+                        i not in found_set:
+                    found += [i]
+                    found_set.add(i)
+                position += 1
+        return found
+
+    def save_snapshot(self, path, signature):
+        """Save the catalog data so that later processes can load it quickly.
+
+        Failures are ignored, as the snapshot only serves as a cache.
+
+        :param path: Path of the snapshot file.
+        :param signature: Value of _get_snapshot_signature when the apps were
+                          read.
+        :return: None
+        """
+        if None in self.ids:
+            return  # Apps without IDs could not be recreated from a snapshot
+
+        fields = []
+        for field in self._SNAPSHOT_FIELDS:
+            value = getattr(self, field)
+            if field in self._ARRAY_FIELDS:
+                value = value.tobytes()
+            elif field in self._ARRAY_MAP_FIELDS:
+                value = {key: values.tobytes()
+                         for key, values in value.items()}
+            fields += [value]
+        snapshot = (_SNAPSHOT_VERSION, marshal.version, signature) + \
+            tuple(fields)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(path),
+                                             delete=False) as snapshot_file:
+                snapshot_file.write(marshal.dumps(snapshot))
+            os.replace(snapshot_file.name, path)
+        except (OSError, ValueError):
+            pass
+
+    def fuzzy_search(self, folded_term, limit, candidates=None):
+        """Rank apps by how well their fields fuzzily match a term.
+
+        Names are scored only for apps sharing enough trigrams with the term,
+        other fields score their weight when they contain the term, and the
+        best are selected with a heap rather than sorting every match.
+
+        Trigrams common to many names are not counted, unless the term has no
+        others, and only the apps sharing the most trigrams with the term,
+        along with those whose name or a word in it starts with the term,
+        have their names scored, so the cost of a keystroke depends on the
+        limit rather than on the size of the catalog.
+
+        Each other field is searched through the apps listed in field_index
+        under the rarest character or trigram of the term, in index order,
+        stopping once limit apps contain the term. Any later app scoring only
+        that field's weight would be ranked below all of these.
+
+        :param folded_term: Normalized filter term.
+        :param limit: Maximum number of apps to return.
+        :param candidates: Optional set of app indices to search within.
+        :return: List of app indices, best match first, empty when the term
+                 is.
+        """
+        if not folded_term:
+            return []
+        postings = sorted((self.trigram_index.get(gram, ())
+                           for gram in _trigrams(folded_term)), key=len)
+        common = _COMMON_TRIGRAM_SHARE * len(self.ids)
+        postings = postings[:1] + [apps for apps in postings[1:]
+                                   if len(apps) <= common]
+        shared_counts = collections.Counter()
+        for apps in postings:
+            shared_counts.update(apps)
+        if candidates is not None:
+            shared_counts = collections.Counter(
+                {i: shared for i, shared in shared_counts.items()
+                 if i in candidates})
+
+        scores = {}
+        min_shared = max(1, len(postings) // 3)
+        for i, shared in shared_counts.most_common(
+                max(limit, _FUZZY_CANDIDATES)):
+            if shared < min_shared:
+                break
+            scores[i] = _fuzzy_score(folded_term, self.folded_names[i],
+                                     shared, len(postings),
+                                     self.trigram_counts[i])
+        for i in self.prefix_search(folded_term, limit, candidates):
+            if i not in scores:
+                scores[i] = _fuzzy_score(folded_term, self.folded_names[i],
+                                         shared_counts[i], len(postings),
+                                         self.trigram_counts[i])
+
+        # Characters and trigrams need no check, as they are the keys
+        grams = [folded_term[start:start + 3]
+                 for start in range(len(folded_term) - 2)] or \
+            list(folded_term)
+        exact = len(folded_term) in (1, 3)
+        for field, weight in enumerate(_FIELD_WEIGHTS.values()):
+            found = 0
+            for i in min((self.field_index.get(str(field) + gram, ())
+                          for gram in grams), key=len):
+                if candidates is not None and i not in candidates or \
+                        not exact and folded_term not in \
+                        self.search_texts[i].split("\n")[field + 1]:
+                    continue
+                if weight > scores.get(i, 0):
+                    scores[i] = weight
+                found += 1
+                if found == limit:
+                    break
+
+        return heapq.nlargest(limit, scores,
+                              key=lambda i: (scores[i], -i))
+
+
+class _DesktopEntry:
+    """Keys of an app's desktop file, read by _scan_desktop_files.
+
+    Provides the methods of Gio.DesktopAppInfo which the catalog reads, so
+    that no Gio object is created for an app until it is requested.
+    """
+
+    __slots__ = ("app_id", "name", "icon_name", "mime_types", "executable",
+                 "generic_name", "keywords", "categories")
+
+    def __init__(self, app_id, name, icon_name, mime_types, executable,
+                 generic_name, keywords, categories):
+        self.app_id = app_id
+        self.name = name
+        self.icon_name = icon_name
+        self.mime_types = mime_types
+        self.executable = executable
+        self.generic_name = generic_name
+        self.keywords = keywords
+        self.categories = categories
+
+    def get_categories(self):
+        """Get the categories of the app.
+
+        :return: Categories, as a ;-separated string, or None.
+        """
+        return self.categories
+
+    def get_display_name(self):
+        """Get the display name of the app.
+
+        :return: Localized full name, or else name.
+        """
+        return self.name
+
+    def get_executable(self):
+        """Get the program of the app.
+
+        :return: Program run by the app, or an empty string.
+        """
+        return self.executable
+
+    def get_generic_name(self):
+        """Get the generic name of the app.
+
+        :return: Localized generic name, or None.
+        """
+        return self.generic_name
+
+    def get_id(self):
+        """Get the desktop file ID of the app.
+
+        :return: Desktop file ID.
+        """
+        return self.app_id
+
+    def get_keywords(self):
+        """Get the keywords of the app.
+
+        :return: List of localized keywords.
+        """
+        return self.keywords
+
+    def get_supported_types(self):
+        """Get the MIME types handled by the app.
+
+        :return: List of MIME types.
+        """
+        return self.mime_types
+
+
+class AppCatalog:
+    """Shared list of installed applications, sorted by display name.
+
+    Apps are loaded on first use and kept until Gio.AppInfoMonitor reports a
+    change to the installed applications, so all widgets share a single scan
+    of the desktop file database. Callbacks added with add_changed_callback
+    are called whenever the catalog is invalidated.
+
+    The query method answers which apps handle some MIME types and match a
+    filter term without any widgets, or Gtk, being involved.
+
+    Optionally, the catalog can be saved to a snapshot under the user's cache
+    directory, letting later processes skip scanning the desktop files while
+    the application directories are unchanged.
+
+    Also optionally, desktop files can be read by a scanner of its own rather
+    than through Gio, see set_use_scanner.
+
+    The content types of files are detected and cached by the catalog too, so
+    that query_for_files can find the apps able to open a selection of files.
+    """
+
+    _default = None
+    # Number of files whose content types are cached
+    _MAX_CONTENT_TYPES = 4096
+
+    def __init__(self):
+        from gi.repository import Gio
+
+        self._data = None
+        self._serial = 0
+        self._content_types = collections.OrderedDict()
+        self._content_types_lock = threading.Lock()
+        self._load_thread = None
+        self._load_callbacks = []
+        self._changed_callbacks = []
+        self._skipped_loads = 0
+        self._use_scanner = False
+        self._use_snapshot = False
+
+        self._monitor = Gio.AppInfoMonitor.get()
+        self._monitor.connect("changed", self._on_apps_changed)
+
+    @classmethod
+    def get_default(cls):
+        """Get the catalog shared by all widgets in this process.
+
+        :return: The default AppCatalog.
+        """
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def _finish_load_thread(self, serial, data):
+        """Store apps loaded by a worker thread, called in the main loop.
+
+        :param serial: Value of the invalidation counter when loading began.
+        :param data: _CatalogData built by the worker thread.
+        :return: False, so that the idle source is removed.
+        """
+        self._load_thread = None
+        if serial != self._serial:
+            # Invalidated while loading, so the apps read may be stale.
+            self._start_load_thread()
+            return False
+        if self._data is None:
+            self._data = data
+        self._run_load_callbacks()
+        return False
+
+    def _load(self):
+        """Load and index installed apps if they are not already cached.
+
+        :return: Whether a load was required.
+        """
+        if self._data is not None:
+            return False
+        self._data = self._read_data()
+        return True
+
+    def _detect_in_thread(self, paths, callback):
+        """Detect the content types of files, run in a worker thread.
+
+        :param paths: List of file paths.
+        :param callback: Function to call with the content types detected.
+        :return: None
+        """
+        from gi.repository import GLib
+        content_types = self.get_content_types(paths)
+        GLib.idle_add(self._finish_detect_thread, callback, content_types)
+
+    def _finish_detect_thread(self, callback, content_types):
+        """Pass content types detected by a worker thread to a callback.
+
+        :param callback: Function to call with the content types.
+        :param content_types: List of content types, one per file.
+        :return: False, so that the idle source is removed.
+        """
+        callback(content_types)
+        return False
+
+    def _load_in_thread(self, serial):
+        """Load installed apps, run in a worker thread.
+
+        :param serial: Value of the invalidation counter when loading began.
+        :return: None
+        """
+        from gi.repository import GLib
+        data = self._read_data()
+        GLib.idle_add(self._finish_load_thread, serial, data)
+
+    def _on_apps_changed(self, monitor):
+        """Invalidate the catalog when installed applications change.
+
+        :param monitor: Gio.AppInfoMonitor which emitted the change.
+        :return: None
+        """
+        self.invalidate()
+
+    def _read_data(self):
+        """Read installed apps from a current snapshot, or else from Gio.
+
+        :return: _CatalogData of the installed apps.
+        """
+        from gi.repository import Gio
+        start = time.perf_counter()
+        if self._use_snapshot:
+            path = _get_snapshot_path()
+            signature = _get_snapshot_signature()
+            data = _CatalogData.load_snapshot(path, signature)
+            if data:
+                _prime_app_monitor()
+                data.load_ms = (time.perf_counter() - start) * 1000
+                return data
+
+        if self._use_scanner:
+            apps = _scan_desktop_files()
+            _prime_app_monitor()
+        else:
+            apps = Gio.AppInfo.get_all()
+        scanned = time.perf_counter()
+        data = _CatalogData(apps)
+        data.load_ms = (scanned - start) * 1000
+        data.index_ms = (time.perf_counter() - scanned) * 1000
+        if self._use_snapshot:
+            data.save_snapshot(path, signature)
+        return data
+
+    def _run_load_callbacks(self):
+        """Call and clear the callbacks waiting for an asynchronous load.
+
+        :return: False, so that an idle source is removed.
+        """
+        callbacks = self._load_callbacks
+        self._load_callbacks = []
+        for callback in callbacks:
+            callback(self)
+        return False
+
+    def _start_load_thread(self):
+        """Start loading installed apps in a worker thread.
+
+        :return: None
+        """
+        self._load_thread = threading.Thread(target=self._load_in_thread,
+                                             args=(self._serial,),
+                                             daemon=True)
+        self._load_thread.start()
+
+    def add_changed_callback(self, callback):
+        """Add a function to call whenever the catalog is invalidated.
+
+        The callback is called with the catalog as its only argument. Changes
+        to installed applications are only noticed while a GLib main loop is
+        running.
+
+        :param callback: Function to call when the catalog changes.
+        :return: None
+        """
+        self._changed_callbacks += [callback]
+
+    def get_app_ids(self):
+        """Get the IDs of the installed apps.
+
+        :return: List of app IDs, in the same order as get_apps.
+        """
+        if not self._load():
+            self._skipped_loads += 1
+        return self._data.ids
+
+    def get_app_index(self, app_id):
+        """Get the index of an installed app from its ID.
+
+        :param app_id: ID of the app, as returned by get_app_ids.
+        :return: Index into the list returned by get_apps, or None if the app
+                 is not installed.
+        """
+        self._load()
+        return self._data.id_index.get(app_id)
+
+    def get_app_info(self, app_id):
+        """Get the Gio.AppInfo of an installed app from its ID.
+
+        When loaded from a snapshot, the Gio.AppInfo is only created once it
+        is first requested.
+
+        :param app_id: ID of the app, as returned by get_app_ids.
+        :return: Gio.AppInfo of the app, or None if it is not installed.
+        """
+        self._load()
+        i = self._data.id_index.get(app_id)
+        return self._data.get_app_info(i) if i is not None else None
+
+    def get_app_info_at(self, app_index):
+        """Get the Gio.AppInfo of an installed app from its index.
+
+        Apps without IDs can only be found this way.
+
+        :param app_index: Index into the list returned by get_app_ids.
+        :return: Gio.AppInfo of the app, or None if there is no such app.
+        """
+        self._load()
+        if not 0 <= app_index < len(self._data.ids):
+            return None
+        return self._data.get_app_info(app_index)
+
+    def get_app_info_getter(self):
+        """Get a function returning the Gio.AppInfo of an app from its index.
+
+        Like get_matcher, the function keeps using the apps loaded when it was
+        made, so apps without IDs are found by the index they had then, even
+        once the catalog has been reloaded.
+
+        :return: Function taking an index into the list returned by
+                 get_app_ids and returning the Gio.AppInfo of the app.
+        """
+        self._load()
+        return self._data.get_app_info
+
+    def get_apps(self):
+        """Get the installed apps, loading them if not already cached.
+
+        Creates every Gio.AppInfo which has not been created yet, so using
+        get_app_ids and get_app_info is preferable.
+
+        :return: List of Gio.AppInfo sorted by display name.
+        """
+        if not self._load():
+            self._skipped_loads += 1
+        return [self._data.get_app_info(i)
+                for i in range(len(self._data.ids))]
+
+    def get_collation_keys(self):
+        """Get the keys by which the installed apps are sorted.
+
+        Keys are made from display names by GLib.utf8_collate_key, so
+        comparing keys compares names as the current locale orders them.
+
+        :return: List of collation keys, in the same order as get_apps.
+        """
+        self._load()
+        return self._data.collation_keys
+
+    def get_content_types(self, paths):
+        """Get the content types of files, detecting them concurrently.
+
+        Types are detected in chunks spread over a pool of threads, and the
+        types of the _MAX_CONTENT_TYPES files most recently asked for are
+        cached by path and modification time, so that asking again for the
+        same files only checks that they are unchanged. This may be called
+        from any thread.
+
+        :param paths: List of file paths.
+        :return: List of content types, which are MIME types, one per path.
+        """
+        paths = list(paths)
+        with self._content_types_lock:
+            cached = {path: self._content_types[path] for path in paths
+                      if path in self._content_types}
+        if len(paths) <= _DETECT_CHUNK:
+            detected = _detect_content_types(paths, cached)
+        else:
+            detected = []
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                for chunk_detected in executor.map(
+                        _detect_content_types,
+                        [paths[start:start + _DETECT_CHUNK]
+                         for start in range(0, len(paths), _DETECT_CHUNK)],
+                        itertools.repeat(cached)):
+                    detected += chunk_detected
+
+        with self._content_types_lock:
+            for path, (mtime, content_type) in zip(paths, detected):
+                if mtime is not None:
+                    self._content_types[path] = (mtime, content_type)
+                    self._content_types.move_to_end(path)
+            while len(self._content_types) > self._MAX_CONTENT_TYPES:
+                self._content_types.popitem(last=False)
+        return [content_type for mtime, content_type in detected]
+
+    def get_content_types_async(self, paths, callback):
+        """Get the content types of files without blocking the main loop.
+
+        Types are detected as by get_content_types, but in a worker thread,
+        and the callback is called from the main loop once they are.
+
+        :param paths: List of file paths.
+        :param callback: Function to call with the list of content types.
+        :return: None
+        """
+        threading.Thread(target=self._detect_in_thread,
+                         args=(list(paths), callback), daemon=True).start()
+
+    def get_display_names(self):
+        """Get the display names of the installed apps.
+
+        :return: List of display names, in the same order as get_apps.
+        """
+        self._load()
+        return self._data.names
+
+    def get_search_texts(self):
+        """Get the normalized text searched by basic matching for each app.
+
+        Each text holds the app's display name, generic name, keywords,
+        categories and executable, casefolded and without accents.
+
+        :return: List of search texts, in the same order as get_apps.
+        """
+        self._load()
+        return self._data.search_texts
+
+    def get_icon_names(self):
+        """Get the icon names of the installed apps.
+
+        :return: List of icon names, in the same order as get_apps.
+        """
+        self._load()
+        return self._data.icon_names
+
+    def get_load_timings(self):
+        """Get how long the cached apps took to load and to index.
+
+        Apps loaded from a snapshot take no time to index.
+
+        :return: Tuple of load and index times in milliseconds.
+        """
+        self._load()
+        return self._data.load_ms, self._data.index_ms
+
+    def get_matcher(self, filter_term, use_regex=False):
+        """Get a function testing whether an app matches a filter term.
+
+        If use_regex is True, the filter term is used as the pattern for a
+        regex search of display names, otherwise basic case-insensitive
+        matching searches display names, generic names, keywords, categories
+        and executables, ignoring accents.
+
+        The function keeps using the apps loaded when it was made, so it may
+        be called from another thread while the catalog is reloaded.
+
+        :param filter_term: String used for filtering apps by display name.
+        :param use_regex: Whether the filter term is used as a regex pattern.
+        :return: Function taking an app index and returning whether the app
+                 matches.
+        """
+        self._load()
+        if use_regex:
+            regex, error = _compile_pattern(filter_term)
+            if error:
+                raise ValueError(error)
+            names = self._data.names
+            return lambda i: regex.search(names[i]) is not None
+        folded_term = normalize_text(filter_term)
+        texts = self._data.search_texts
+        return lambda i: folded_term in texts[i]
+
+    def get_mime_matches(self, mime_types):
+        """Get the indices of apps supporting any of the given MIME types.
+
+        A MIME type may be given in full (e.g. "image/png") or as a major type
+        only (e.g. "image"), which matches apps supporting any of its types.
+        A full type also matches apps supporting a type it is a subclass or
+        an alias of, such as "text/plain" for "text/x-python".
+
+        :param mime_types: List of MIME types to look up.
+        :return: Set of indices into the list returned by get_apps.
+        """
+        self._load()
+        data = self._data
+        return set().union(*[data.mime_index[key]
+                             for key in data.get_mime_keys(mime_types)])
+
+    def get_type_matches(self, mime_types=None, file_types=None):
+        """Get the indices of apps supporting any MIME type and all file types.
+
+        Apps support a file type as they do a MIME type, see get_mime_matches,
+        so the apps able to open every one of many files are found from the
+        few distinct types among them.
+
+        :param mime_types: Optional list of MIME types, any of which apps must
+                           support.
+        :param file_types: Optional list of content types, all of which apps
+                           must support.
+        :return: Set of indices into the list returned by get_apps, or None
+                 if no types are given, as every app matches.
+        """
+        matches = None
+        for file_type in set(file_types or ()):
+            type_matches = self.get_mime_matches([file_type])
+            matches = type_matches if matches is None \
+                else matches & type_matches
+        if mime_types:
+            mime_matches = self.get_mime_matches(mime_types)
+            matches = mime_matches if matches is None \
+                else matches & mime_matches
+        return matches
+
+    def fuzzy_search(self, filter_term, limit, candidates=None):
+        """Rank apps by how well they fuzzily match a term.
+
+        Matching tolerates typos, so "firfox" still finds Firefox, and favours
+        names starting with the term or containing it at a word boundary,
+        followed by matches of generic names, keywords, executables and
+        categories.
+
+        :param filter_term: String used for filtering apps by display name.
+        :param limit: Maximum number of apps to return.
+        :param candidates: Optional set of app indices to search within.
+        :return: List of indices into the list returned by get_apps, best
+                 match first. A term left empty once normalized, such as a
+                 lone accent, matches every app, in the order listed.
+        """
+        self._load()
+        folded_term = normalize_text(filter_term)
+        if not folded_term:
+            app_indices = range(len(self._data.ids)) if candidates is None \
+                else sorted(candidates)
+            return list(itertools.islice(app_indices, limit))
+        return self._data.fuzzy_search(folded_term, limit, candidates)
+
+    def prefix_search(self, filter_term, limit, candidates=None):
+        """Find apps whose display name, or a word in it, starts with a term.
+
+        Apps whose name starts with the term come first, and each search takes
+        time logarithmic in the number of apps, plus the number of matches.
+
+        :param filter_term: String the name or word must start with.
+        :param limit: Maximum number of apps to return.
+        :param candidates: Optional set of app indices to search within.
+        :return: List of indices into the list returned by get_apps.
+        """
+        self._load()
+        return self._data.prefix_search(normalize_text(filter_term), limit,
+                                        candidates)
+
+    def get_prefix_searcher(self):
+        """Get a function finding apps whose names start with a term.
+
+        Like get_matcher, the function keeps using the apps loaded when it was
+        made, so the indices it returns stay those of the apps a widget lists
+        until the widget has applied a reload.
+
+        :return: Function taking a term, a limit and an optional set of
+                 candidates, as prefix_search does, and returning a list of
+                 app indices.
+        """
+        self._load()
+        data = self._data
+        return lambda filter_term, limit, candidates=None: \
+            data.prefix_search(normalize_text(filter_term), limit, candidates)
+
+    def get_ranker(self, filter_term):
+        """Get a function ranking apps by how well they fuzzily match a term.
+
+        Like get_matcher, the function keeps using the apps loaded when it was
+        made, so it may be called from another thread.
+
+        :param filter_term: String used for filtering apps by display name.
+        :return: Function taking a limit and an optional set of candidates,
+                 as fuzzy_search does, and returning a list of app indices,
+                 best match first.
+        """
+        self._load()
+        return functools.partial(self._data.fuzzy_search,
+                                 normalize_text(filter_term))
+
+    def get_skipped_loads(self):
+        """Get the number of loads which were avoided by using the cache.
+
+        :return: Number of get_apps, get_app_ids and load_async calls served
+                 from the cache.
+        """
+        return self._skipped_loads
+
+    def get_used_apps(self, app_indices=None):
+        """Get the apps which have been chosen before, most frecent first.
+
+        :param app_indices: Optional container of app indices, to only get
+                            apps among them.
+        :return: List of app indices, ordered by AppUsage score.
+        """
+        self._load()
+        data = self._data
+        scores = AppUsage.get_default().get_scores()
+        used_apps = [data.id_index[app_id] for app_id in scores
+                     if app_id in data.id_index]
+        if app_indices is not None:
+            used_apps = [i for i in used_apps if i in app_indices]
+        used_apps.sort(key=lambda i: scores[data.ids[i]], reverse=True)
+        return used_apps
+
+    def get_use_scanner(self):
+        """Get whether desktop files are read by the catalog's own scanner.
+
+        :return: Whether the scanner is used.
+        """
+        return self._use_scanner
+
+    def get_use_snapshot(self):
+        """Get whether the catalog is saved to and loaded from a snapshot.
+
+        :return: Whether a snapshot is used.
+        """
+        return self._use_snapshot
+
+    def invalidate(self):
+        """Drop the cached apps so they are reloaded on next use.
+
+        :return: None
+        """
+        self._data = None
+        self._serial += 1
+        for callback in list(self._changed_callbacks):
+            callback(self)
+
+    def is_loaded(self):
+        """Get whether installed apps are currently cached.
+
+        :return: Whether apps can be read without loading them.
+        """
+        return self._data is not None
+
+    def load_async(self, callback):
+        """Load installed apps in a worker thread if not already cached.
+
+        The callback is called from the main loop with the catalog as its only
+        argument once the apps are available.
+
+        :param callback: Function to call once apps are loaded.
+        :return: None
+        """
+        self._load_callbacks += [callback]
+        from gi.repository import GLib
+        if self._data is not None:
+            self._skipped_loads += 1
+            GLib.idle_add(self._run_load_callbacks)
+        elif self._load_thread is None:
+            self._start_load_thread()
+
+    def iter_query(self, filter_term="", mime_types=None, use_regex=False,
+                   use_fuzzy=False, limit=None, offset=0,
+                   use_frecency=False, file_types=None):
+        """Yield the IDs of the apps handling MIME types and matching a term.
+
+        Takes the same arguments as query, but apps are matched lazily, so
+        only as much of the catalog is scanned as is needed for the IDs taken.
+
+        :return: Generator of app IDs.
+        """
+        app_ids = self.get_app_ids()
+        for i in self.iter_query_indices(filter_term, mime_types, use_regex,
+                                         use_fuzzy, limit, offset,
+                                         use_frecency, file_types):
+            yield app_ids[i]
+
+    def iter_query_indices(self, filter_term="", mime_types=None,
+                           use_regex=False, use_fuzzy=False, limit=None,
+                           offset=0, use_frecency=False, file_types=None):
+        """Yield the indices of apps handling MIME types and matching a term.
+
+        Takes the same arguments as query. Apps are checked in the order they
+        are yielded, and checking stops once limit apps have been yielded or
+        the caller stops iterating. Fuzzy matching is the exception, as every
+        candidate is scored before the best are yielded. Apps chosen before
+        are few, so when ordered by frecency they are checked first, then the
+        remaining apps are checked lazily.
+
+        A ValueError is raised on first use if use_regex is True and the
+        filter term is not a valid regex pattern. Apps loaded after iteration
+        began are not included.
+
+        :return: Generator of indices into the list returned by get_apps.
+        """
+        self._load()
+        data = self._data
+        if file_types:
+            app_indices = sorted(self.get_type_matches(mime_types,
+                                                       file_types))
+        elif mime_types:
+            app_indices = data.iter_mime_matches(mime_types)
+        else:
+            app_indices = range(len(data.ids))
+        stop = None if limit is None else offset + limit
+
+        folded_term = normalize_text(filter_term) if filter_term else ""
+        if folded_term and use_fuzzy and not use_regex:
+            candidates = self.get_type_matches(mime_types, file_types)
+            app_indices = data.fuzzy_search(
+                folded_term, len(data.ids) if stop is None else stop,
+                candidates)
+        else:
+            if filter_term:
+                is_match = self.get_matcher(filter_term, use_regex)
+                app_indices = filter(is_match, app_indices)
+            if use_frecency:
+                used_apps = self.get_used_apps(
+                    self.get_type_matches(mime_types, file_types))
+                if filter_term:
+                    used_apps = list(filter(is_match, used_apps))
+                used = set(used_apps)
+                app_indices = itertools.chain(
+                    used_apps, (i for i in app_indices if i not in used))
+        yield from itertools.islice(app_indices, offset, stop)
+
+    def query(self, filter_term="", mime_types=None, use_regex=False,
+              use_fuzzy=False, limit=None, offset=0, use_frecency=False,
+              file_types=None):
+        """Get the IDs of the apps handling MIME types and matching a term.
+
+        :param filter_term: String used for filtering apps, see get_matcher.
+                            All apps match an empty string.
+        :param mime_types: Optional list of MIME types, see get_mime_matches.
+        :param use_regex: Whether the filter term is used as a regex pattern.
+        :param use_fuzzy: Whether apps are fuzzily matched and ranked by the
+                          filter term, if use_regex is False.
+        :param limit: Optional maximum number of apps to return.
+        :param offset: Number of matching apps to skip, for paging.
+        :param use_frecency: Whether apps chosen before are listed first, most
+                             frecent first, unless fuzzily ranked.
+        :param file_types: Optional list of content types, all of which apps
+                           must support, see get_type_matches.
+        :return: List of app IDs, best match first when fuzzy matching,
+                 otherwise sorted by display name.
+        """
+        return list(self.iter_query(filter_term, mime_types, use_regex,
+                                    use_fuzzy, limit, offset, use_frecency,
+                                    file_types))
+
+    def query_for_files(self, paths, filter_term="", mime_types=None,
+                        use_regex=False, use_fuzzy=False, limit=None,
+                        offset=0, use_frecency=False):
+        """Get the IDs of the apps able to open all of the given files.
+
+        The content types of the files are detected as by get_content_types,
+        and apps are matched by query for those types. The remaining
+        arguments are the same as query's.
+
+        :param paths: List of file paths. No files restricts no apps.
+        :return: List of app IDs.
+        """
+        return self.query(filter_term, mime_types, use_regex, use_fuzzy,
+                          limit, offset, use_frecency,
+                          self.get_content_types(paths))
+
+    def query_indices(self, filter_term="", mime_types=None, use_regex=False,
+                      use_fuzzy=False, limit=None, offset=0,
+                      use_frecency=False, file_types=None):
+        """Get the indices of the apps handling MIME types and matching a term.
+
+        Takes the same arguments as query, raising ValueError if use_regex is
+        True and the filter term is not a valid regex pattern.
+
+        :return: List of indices into the list returned by get_apps.
+        """
+        return list(self.iter_query_indices(filter_term, mime_types,
+                                            use_regex, use_fuzzy, limit,
+                                            offset, use_frecency, file_types))
+
+    def remove_changed_callback(self, callback):
+        """Remove a function added with add_changed_callback.
+
+        :param callback: Function to remove.
+        :return: None
+        """
+        self._changed_callbacks.remove(callback)
+
+    def set_use_scanner(self, use_scanner):
+        """Set whether desktop files are read by the catalog's own scanner.
+
+        The scanner finds desktop files with os.scandir, following the same
+        precedence as Gio, and parses only the keys the catalog uses in a
+        pool of threads. A Gio.DesktopAppInfo is only created for an app when
+        it is requested, such as when it is selected. This should be set
+        before the catalog is first loaded.
+
+        :param use_scanner: Whether the scanner is used.
+        :return: None
+        """
+        if not type(use_scanner) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(use_scanner).__name__)
+        self._use_scanner = use_scanner
+
+    def set_use_snapshot(self, use_snapshot):
+        """Set whether the catalog is saved to and loaded from a snapshot.
+
+        The snapshot is kept in $XDG_CACHE_HOME/AppChooser, and is only used
+        while the application directories and locale are unchanged. This
+        should be set before the catalog is first loaded.
+
+        :param use_snapshot: Whether a snapshot is used.
+        :return: None
+        """
+        if not type(use_snapshot) == bool:
+            raise TypeError("must be type bool, not " +
+                            type(use_snapshot).__name__)
+        self._use_snapshot = use_snapshot
+
+
+class AppUsage:
+    """Persistent record of how often and how recently apps were chosen.
+
+    Each app has a frecency score: the sum of a weight for every time it was
+    chosen, where weights halve every _HALF_LIFE seconds. Rather than decaying
+    every score as time passes, a choice is given the weight it would have at
+    a fixed epoch, grown by the time since. Scores are kept as logarithms of
+    these sums, so recording a choice updates a single score in O(1), and
+    scores recorded at different times compare correctly.
+
+    Choices are appended to a log under the user's data directory. When the
+    log is read, it is rewritten with one line per app if it has grown well
+    beyond that.
+    """
+
+    _default = None
+    # Seconds over which the weight of a choice halves
+    _HALF_LIFE = 14 * 24 * 60 * 60
+
+    def __init__(self, path=None):
+        self._path = path
+        self._scores = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_default(cls):
+        """Get the usage record shared by all widgets in this process.
+
+        :return: The default AppUsage.
+        """
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def _add_score(self, app_id, weight):
+        """Add the logarithm of a weight to an app's score.
+
+        :param app_id: ID of the app.
+        :param weight: Logarithm of the weight to add.
+        :return: None
+        """
+        score = self._scores.get(app_id)
+        if score is None:
+            self._scores[app_id] = weight
+        else:
+            high, low = max(score, weight), min(score, weight)
+            self._scores[app_id] = high + math.log1p(math.exp(low - high))
+
+    def _get_path(self):
+        """Get the path of the usage log.
+
+        :return: Path of the log, by default under the user's data directory.
+        """
+        if self._path is None:
+            from gi.repository import GLib
+            self._path = os.path.join(GLib.get_user_data_dir(), "AppChooser",
+                                      "usage.log")
+        return self._path
+
+    def _load(self):
+        """Read the usage log if it has not been read yet.
+
+        Failures are ignored, leaving the apps it could not be read for
+        without a score.
+
+        :return: None
+        """
+        if self._scores is not None:
+            return
+        self._scores = {}
+        line_count = 0
+        try:
+            with open(self._get_path(), encoding="utf-8") as usage_file:
+                for line in usage_file:
+                    weight, tab, app_id = line.rstrip("\n").partition("\t")
+                    try:
+                        self._add_score(app_id, float(weight))
+                    except ValueError:
+                        continue
+                    line_count += 1
+        except OSError:
+            return
+        if line_count > 2 * len(self._scores) + 64:
+            self._save()
+
+    def _save(self):
+        """Rewrite the usage log with a single line per app.
+
+        :return: None
+        """
+        path = self._get_path()
+        try:
+            with tempfile.NamedTemporaryFile(
+                    "w", encoding="utf-8", dir=os.path.dirname(path),
+                    delete=False) as usage_file:
+                for app_id, score in self._scores.items():
+                    usage_file.write("{0!r}\t{1}\n".format(score, app_id))
+            os.replace(usage_file.name, path)
+        except OSError:
+            pass
+
+    def get_score(self, app_id):
+        """Get the frecency score of an app.
+
+        :param app_id: ID of the app.
+        :return: Score, higher for apps chosen more often and more recently,
+                 or None if the app has never been chosen.
+        """
+        with self._lock:
+            self._load()
+            return self._scores.get(app_id)
+
+    def get_scores(self):
+        """Get the frecency scores of every app chosen before.
+
+        :return: Dictionary mapping app IDs to scores, see get_score.
+        """
+        with self._lock:
+            self._load()
+            return dict(self._scores)
+
+    def record(self, app_id):
+        """Record that an app was chosen.
+
+        :param app_id: ID of the app, or None for apps without one, which are
+                       not recorded.
+        :return: None
+        """
+        if not app_id:
+            return
+        weight = time.time() * math.log(2) / self._HALF_LIFE
+        with self._lock:
+            self._load()
+            self._add_score(app_id, weight)
+            path = self._get_path()
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "a", encoding="utf-8") as usage_file:
+                    usage_file.write("{0!r}\t{1}\n".format(weight, app_id))
+            except OSError:
+                pass
+
+
+def iter_query(filter_term="", mime_types=None, use_regex=False,
+               use_fuzzy=False, limit=None, offset=0, use_frecency=False,
+               file_types=None):
+    """Yield the IDs of the apps handling MIME types and matching a term.
+
+    Queries the catalog shared with the widgets, see AppCatalog.iter_query.
+
+    :return: Generator of app IDs.
+    """
+    return AppCatalog.get_default().iter_query(
+        filter_term, mime_types, use_regex, use_fuzzy, limit, offset,
+        use_frecency, file_types)
+
+
+def query(filter_term="", mime_types=None, use_regex=False, use_fuzzy=False,
+          limit=None, offset=0, use_frecency=False, file_types=None):
+    """Get the IDs of the apps handling MIME types and matching a term.
+
+    Queries the catalog shared with the widgets, see AppCatalog.query.
+
+    :return: List of app IDs.
+    """
+    return AppCatalog.get_default().query(filter_term, mime_types, use_regex,
+                                          use_fuzzy, limit, offset,
+                                          use_frecency, file_types)
+
+
+def query_for_files(paths, filter_term="", mime_types=None, use_regex=False,
+                    use_fuzzy=False, limit=None, offset=0,
+                    use_frecency=False):
+    """Get the IDs of the apps able to open all of the given files.
+
+    Queries the catalog shared with the widgets, see
+    AppCatalog.query_for_files.
+
+    :return: List of app IDs.
+    """
+    return AppCatalog.get_default().query_for_files(
+        paths, filter_term, mime_types, use_regex, use_fuzzy, limit, offset,
+        use_frecency)
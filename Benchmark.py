@@ -0,0 +1,351 @@
+# Copyright (C) 2017 Tom Hartill
+#
+# Benchmark.py - Performance benchmarks for the widgets provided by AppChooser
+#
+# AppChooser is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# AppChooser is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# AppChooser; if not, see http://www.gnu.org/licenses/.
+#
+# An up to date version can be found at:
+# https://github.com/Tomha/python-gtk-app-chooser
+
+"""Benchmark AppChooser against synthetic catalogs of desktop files.
+
+For each catalog size, desktop files with generated names, icons and MIME
+types are written to a temporary directory, which replaces XDG_DATA_DIRS for
+a child process that times the widgets. GLib caches the data directories, so
+every size needs a process of its own.
+
+The query engine in AppQuery is always timed. The widgets are only timed when
+a display can be opened, so run headless with Xvfb or the Broadway backend:
+
+    xvfb-run -a python3 Benchmark.py --sizes 100,1000,20000
+    GDK_BACKEND=broadway BROADWAY_DISPLAY=:5 python3 Benchmark.py
+
+Results are written as JSON. Given a previous result file as --baseline, any
+metric which has grown by more than the tolerance fails the run, so it can be
+used as a regression gate.
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+NAME_WORDS = ["Fire", "Thunder", "Libre", "Open", "Visual", "Text", "Image",
+              "Video", "Audio", "Photo", "Code", "Web", "Mail", "Chat",
+              "Office", "Music", "Note", "Paint", "Disk", "System", "Font",
+              "Map", "Game", "Book", "Clock", "Weather", "Remote", "Cloud"]
+NAME_SUFFIXES = ["fox", "bird", "Writer", "Editor", "Viewer", "Player",
+                 "Studio", "Manager", "Browser", "Terminal", "Calculator",
+                 "Reader", "Recorder", "Monitor", "Converter", "Client"]
+ICON_NAMES = ["firefox", "thunderbird", "accessories-text-editor",
+              "image-viewer", "utilities-terminal", "multimedia-player",
+              "internet-mail", "office-calendar", "system-file-manager",
+              "applications-games", "preferences-system", "help-browser",
+              "no-such-icon"]
+MIME_TYPES = ["text/plain", "text/html", "text/x-python", "text/markdown",
+              "text/csv", "image/png", "image/jpeg", "image/gif",
+              "image/svg+xml", "image/webp", "audio/mpeg", "audio/ogg",
+              "audio/flac", "video/mp4", "video/webm", "video/x-matroska",
+              "application/pdf", "application/zip", "application/json",
+              "application/xml", "application/x-tar", "application/msword",
+              "application/vnd.oasis.opendocument.text",
+              "x-scheme-handler/http", "x-scheme-handler/https",
+              "x-scheme-handler/mailto", "inode/directory"]
+CATEGORIES = ["AudioVideo", "Development", "Education", "Game", "Graphics",
+              "Network", "Office", "Science", "Settings", "System",
+              "Utility"]
+KEYWORDS = ["browser", "internet", "editor", "pdf", "document", "music",
+            "video", "photo", "terminal", "mail", "chat", "spreadsheet"]
+
+# Terms typed one character at a time, as a user would
+TYPING_SEQUENCES = ["firefox", "text editor", "pdf", "firfox", "zzz"]
+
+# MIME types used when timing a filtered combo box
+COMBO_MIME_TYPES = ["image/png", "text"]
+
+DESKTOP_ENTRY = """[Desktop Entry]
+Type=Application
+Name={name}
+GenericName={generic_name}
+Exec={executable} %U
+Icon={icon}
+MimeType={mime_types};
+Categories={categories};
+Keywords={keywords};
+"""
+
+
+def write_catalog(root, count, seed):
+    """Write a synthetic catalog of desktop files and their executables.
+
+    :param root: Directory to write the catalog to.
+    :param count: Number of desktop files to write.
+    :param seed: Seed for the random choices made.
+    :return: Tuple of the data directory and the executable directory.
+    """
+    rng = random.Random(seed)
+    data_dir = os.path.join(root, "share")
+    app_dir = os.path.join(data_dir, "applications")
+    bin_dir = os.path.join(root, "bin")
+    os.makedirs(app_dir)
+    os.makedirs(bin_dir)
+
+    # GLib skips desktop files whose executable is missing from PATH.
+    true_path = shutil.which("true")
+    executables = ["bench-app-{0}".format(i) for i in range(200)]
+    for executable in executables:
+        os.symlink(true_path, os.path.join(bin_dir, executable))
+
+    for i in range(count):
+        name = "{0} {1}".format(rng.choice(NAME_WORDS),
+                                rng.choice(NAME_SUFFIXES))
+        if rng.random() < 0.5:
+            name += " {0}".format(i)
+        entry = DESKTOP_ENTRY.format(
+            name=name,
+            generic_name=rng.choice(NAME_SUFFIXES),
+            executable=rng.choice(executables),
+            icon=rng.choice(ICON_NAMES),
+            mime_types=";".join(rng.sample(MIME_TYPES, rng.randint(0, 8))),
+            categories=";".join(rng.sample(CATEGORIES, rng.randint(1, 3))),
+            keywords=";".join(rng.sample(KEYWORDS, rng.randint(0, 3))))
+        desktop_path = os.path.join(app_dir, "bench-{0}.desktop".format(i))
+        with open(desktop_path, "w") as desktop_file:
+            desktop_file.write(entry)
+
+    return data_dir, bin_dir
+
+
+def summarize(latencies):
+    """Summarize a list of latencies.
+
+    :param latencies: List of latencies in milliseconds.
+    :return: Dictionary of the median, 95th percentile and maximum.
+    """
+    ordered = sorted(latencies)
+    return {"p50_ms": statistics.median(ordered),
+            "p95_ms": ordered[int(0.95 * (len(ordered) - 1))],
+            "max_ms": ordered[-1]}
+
+
+def time_queries(catalog, use_fuzzy):
+    """Time a headless query for every keystroke of the typing sequences.
+
+    :param catalog: AppCatalog which has been loaded.
+    :param use_fuzzy: Whether apps are fuzzily matched.
+    :return: Dictionary summarizing the query latencies.
+    """
+    latencies = []
+    for sequence in TYPING_SEQUENCES:
+        for end in range(1, len(sequence) + 1):
+            start = time.perf_counter()
+            catalog.query(sequence[:end], use_fuzzy=use_fuzzy, limit=100)
+            latencies += [(time.perf_counter() - start) * 1000]
+    return summarize(latencies)
+
+
+def time_typing(dialog):
+    """Time a dialog filter pass for every keystroke of the typing sequences.
+
+    :param dialog: AppChooserDialog which has been populated.
+    :return: Dictionary summarizing the filter latencies.
+    """
+    latencies = []
+    for sequence in TYPING_SEQUENCES:
+        for end in range(1, len(sequence) + 1):
+            start = time.perf_counter()
+            for _ in dialog._filter_pass(sequence[:end]):
+                pass
+            latencies += [(time.perf_counter() - start) * 1000]
+        for _ in dialog._filter_pass(""):
+            pass
+    return summarize(latencies)
+
+
+def run_child():
+    """Time the query engine and widgets against the catalog in XDG_DATA_DIRS.
+
+    Prints a JSON object of metrics to stdout.
+
+    :return: Exit status.
+    """
+    import AppQuery
+
+    results = {}
+    catalog = AppQuery.AppCatalog.get_default()
+    start = time.perf_counter()
+    results["app_count"] = len(catalog.get_app_ids())
+    results["catalog_load_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    catalog.query(mime_types=COMBO_MIME_TYPES)
+    results["mime_query_ms"] = (time.perf_counter() - start) * 1000
+    for key, value in time_queries(catalog, False).items():
+        results["query_keystroke_" + key] = value
+    for key, value in time_queries(catalog, True).items():
+        results["fuzzy_query_keystroke_" + key] = value
+
+    try:
+        import gi
+        gi.require_version('Gtk', '3.0')
+        from gi.repository import Gtk
+        has_display = Gtk.init_check(sys.argv)[0]
+    except (ImportError, ValueError):
+        has_display = False
+    if has_display:
+        time_widgets(results)
+    else:
+        print("Cannot open a display, so only the query engine was timed. "
+              "Run under xvfb-run or with GDK_BACKEND=broadway to time the "
+              "widgets too.", file=sys.stderr)
+
+    results["peak_rss_kib"] = resource.getrusage(
+        resource.RUSAGE_SELF).ru_maxrss
+    json.dump(results, sys.stdout)
+    return 0
+
+
+def time_widgets(results):
+    """Time the widgets, once Gtk has been initialized.
+
+    :param results: Dictionary to add metrics to.
+    :return: None
+    """
+    import AppChooser
+
+    dialog = AppChooser.AppChooserDialog()
+    start = time.perf_counter()
+    for _ in dialog._populate():
+        pass
+    results["dialog_populate_ms"] = (time.perf_counter() - start) * 1000
+
+    for key, value in time_typing(dialog).items():
+        results["filter_keystroke_" + key] = value
+    dialog.set_use_fuzzy(True)
+    for key, value in time_typing(dialog).items():
+        results["fuzzy_keystroke_" + key] = value
+    dialog.destroy()
+
+    combo = AppChooser.AppChooserComboBox()
+    combo.set_mime_types(COMBO_MIME_TYPES)
+    start = time.perf_counter()
+    combo.populate()
+    results["mime_combo_populate_ms"] = (time.perf_counter() - start) * 1000
+    combo.destroy()
+
+
+def run_size(count, seed):
+    """Benchmark a catalog of the given size in a child process.
+
+    :param count: Number of desktop files in the catalog.
+    :param seed: Seed for generating the catalog.
+    :return: Dictionary of metrics.
+    """
+    with tempfile.TemporaryDirectory(prefix="appchooser-bench-") as root:
+        data_dir, bin_dir = write_catalog(root, count, seed)
+        env = dict(os.environ)
+        env["XDG_DATA_DIRS"] = data_dir
+        env["XDG_DATA_HOME"] = os.path.join(root, "home")
+        env["XDG_CACHE_HOME"] = os.path.join(root, "cache")
+        env["PATH"] = bin_dir + os.pathsep + env.get("PATH", "")
+        child = subprocess.run([sys.executable, os.path.abspath(__file__),
+                                "--child"], env=env, stdout=subprocess.PIPE,
+                               universal_newlines=True)
+        if child.returncode != 0:
+            raise RuntimeError("benchmark of {0} apps failed".format(count))
+        return json.loads(child.stdout)
+
+
+def find_regressions(results, baseline, tolerance, min_delta):
+    """Compare results against a baseline.
+
+    :param results: Dictionary of metrics by catalog size.
+    :param baseline: Dictionary of baseline metrics by catalog size.
+    :param tolerance: Allowed growth as a fraction of the baseline value.
+    :param min_delta: Growth below which a metric never regresses.
+    :return: List of descriptions of regressed metrics.
+    """
+    regressions = []
+    for size, metrics in results.items():
+        for metric, value in metrics.items():
+            if not metric.endswith(("_ms", "_kib")):
+                continue
+            old_value = baseline.get(size, {}).get(metric)
+            if old_value is None:
+                continue
+            if value > old_value * (1 + tolerance) and \
+                    value - old_value > min_delta:
+                regressions += ["{0} apps: {1} {2:.2f} -> {3:.2f}".format(
+                    size, metric, old_value, value)]
+    return regressions
+
+
+def main():
+    """Benchmark each catalog size, comparing results against a baseline.
+
+    Arguments are read from the command line. With --child, only the catalog
+    in XDG_DATA_DIRS is timed, see run_child.
+
+    :return: Exit status, 1 if any result regressed from the baseline.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,5000,20000",
+                        help="comma separated catalog sizes")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for generating catalogs")
+    parser.add_argument("--output", help="file to write JSON results to")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed growth over the baseline, as a fraction")
+    parser.add_argument("--min-delta", type=float, default=1.0,
+                        help="growth always allowed, in ms or KiB")
+    parser.add_argument("--child", action="store_true",
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child()
+
+    results = {}
+    for size in args.sizes.split(","):
+        results[size] = run_size(int(size), args.seed)
+        print("{0} apps benchmarked".format(size), file=sys.stderr)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = find_regressions(results, baseline, args.tolerance,
+                                       args.min_delta)
+        for regression in regressions:
+            print("Regression: " + regression, file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+# Copyright (C) 2017 Tom Hartill
+#
+# conftest.py - Fixed catalog of desktop files which the tests of AppQuery
+# read instead of the installed applications.
+#
+# AppChooser is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# AppChooser is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# AppChooser; if not, see http://www.gnu.org/licenses/.
+#
+# An up to date version can be found at:
+# https://github.com/Tomha/python-gtk-app-chooser
+
+# GLib reads the XDG directories once per process, so they are pointed at the
+# catalog when this module is imported, before anything imports gi.
+
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+
+# Desktop files of the system data directory, by relative path
+SYSTEM_ENTRIES = {
+    "firefox.desktop": {
+        "Name": "Firefox Web Browser", "GenericName": "Web Browser",
+        "Keywords": "Internet;WWW;", "Categories": "Network;WebBrowser;",
+        "MimeType": "text/html;x-scheme-handler/http;", "Exec": "firefox %u"},
+    "gimp.desktop": {
+        "Name": "GNU Image Manipulation Program",
+        "GenericName": "Image Editor", "Categories": "Graphics;",
+        "MimeType": "image/png;image/jpeg;", "Exec": "gimp %U"},
+    "gedit.desktop": {
+        "Name": "Text Editor", "Keywords": "notepad;",
+        "Categories": "Utility;TextEditor;", "MimeType": "text/plain;",
+        "Exec": "gedit %U"},
+    "ecran.desktop": {
+        "Name": "Écran Partagé", "Categories": "Utility;", "Exec": "ecran"},
+    "hexview.desktop": {
+        "Name": "Hex Viewer", "MimeType": "application/octet-stream;",
+        "Categories": "Development;", "Exec": "hexview %f"},
+    "kde/konsole.desktop": {
+        "Name": "Konsole", "Categories": "System;TerminalEmulator;",
+        "Exec": "konsole"},
+    "missing.desktop": {
+        "Name": "Missing Program", "Exec": "not-installed-program"},
+    "shadowed.desktop": {"Name": "System Version", "Exec": "gedit"},
+    "hidden.desktop": {"Name": "Hidden Elsewhere", "Exec": "gedit"},
+}
+
+# Desktop files of the user's data directory, which shadow those above
+USER_ENTRIES = {
+    "shadowed.desktop": {"Name": "User Version", "Exec": "gedit"},
+    "hidden.desktop": {"Name": "Hidden Elsewhere", "Exec": "gedit",
+                       "Hidden": "true"},
+}
+
+EXECUTABLES = ["ecran", "firefox", "gedit", "gimp", "hexview", "konsole"]
+
+
+def _write_entries(app_dir, entries):
+    """Write desktop files under an application directory.
+
+    :param app_dir: Path of the application directory.
+    :param entries: Dictionary mapping relative paths to dictionaries of the
+                    keys of their [Desktop Entry] groups.
+    :return: None
+    """
+    for path, keys in entries.items():
+        path = os.path.join(app_dir, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as desktop_file:
+            desktop_file.write("[Desktop Entry]\nType=Application\n")
+            for key, value in keys.items():
+                desktop_file.write("{0}={1}\n".format(key, value))
+
+
+def _write_catalog(root):
+    """Write the catalog and point the XDG directories and PATH at it.
+
+    :param root: Directory to write the catalog to.
+    :return: None
+    """
+    data_dir = os.path.join(root, "share")
+    user_dir = os.path.join(root, "home", "share")
+    bin_dir = os.path.join(root, "bin")
+    _write_entries(os.path.join(data_dir, "applications"), SYSTEM_ENTRIES)
+    _write_entries(os.path.join(user_dir, "applications"), USER_ENTRIES)
+
+    # GLib skips desktop files whose executable is missing from PATH.
+    os.makedirs(bin_dir)
+    true_path = shutil.which("true")
+    for executable in EXECUTABLES:
+        os.symlink(true_path, os.path.join(bin_dir, executable))
+    # MIME subclasses are read from the shared MIME database
+    if os.path.isdir("/usr/share/mime"):
+        os.symlink("/usr/share/mime", os.path.join(data_dir, "mime"))
+
+    os.environ["XDG_DATA_DIRS"] = data_dir
+    os.environ["XDG_DATA_HOME"] = user_dir
+    os.environ["XDG_CACHE_HOME"] = os.path.join(root, "cache")
+    os.environ["XDG_CONFIG_HOME"] = os.path.join(root, "config")
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+
+
+_root = tempfile.mkdtemp(prefix="AppChooser-tests-")
+_write_catalog(_root)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Remove the catalog once the tests have run.
+
+    :param session: pytest.Session which finished.
+    :param exitstatus: Status the tests will exit with.
+    :return: None
+    """
+    shutil.rmtree(_root, ignore_errors=True)
@@ -0,0 +1,208 @@
+# Copyright (C) 2017 Tom Hartill
+#
+# test_AppQuery.py - Tests of the application catalog and queries over it,
+# run against the desktop files written by conftest.py.
+#
+# AppChooser is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 3 of the License, or (at your option) any later
+# version.
+#
+# AppChooser is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# AppChooser; if not, see http://www.gnu.org/licenses/.
+#
+# An up to date version can be found at:
+# https://github.com/Tomha/python-gtk-app-chooser
+
+import os
+
+import pytest
+
+pytest.importorskip("gi")
+
+import AppQuery
+from AppQuery import AppCatalog, AppUsage
+
+
+INSTALLED_IDS = {"ecran.desktop", "firefox.desktop", "gedit.desktop",
+                 "gimp.desktop", "hexview.desktop", "kde-konsole.desktop",
+                 "shadowed.desktop"}
+
+
+@pytest.fixture(params=[False, True], ids=["gio", "scanner"])
+def catalog(request):
+    """Catalog of the test desktop files, read through Gio or the scanner.
+
+    :param request: pytest.FixtureRequest giving whether the scanner is used.
+    :return: AppCatalog which has not been loaded yet.
+    """
+    catalog = AppCatalog()
+    catalog.set_use_scanner(request.param)
+    return catalog
+
+
+def test_lists_installed_apps_by_name(catalog):
+    from gi.repository import GLib
+    assert set(catalog.get_app_ids()) == INSTALLED_IDS
+    names = catalog.get_display_names()
+    assert names == sorted(names, key=lambda name: GLib.utf8_collate_key(
+        name, -1))
+
+
+def test_user_entries_shadow_system_entries(catalog):
+    app_index = catalog.get_app_index("shadowed.desktop")
+    assert catalog.get_display_names()[app_index] == "User Version"
+    assert catalog.get_app_index("hidden.desktop") is None
+
+
+def test_programs_missing_from_path_are_dropped(catalog):
+    assert catalog.get_app_index("missing.desktop") is None
+
+
+def test_scanner_reads_the_apps_gio_lists():
+    entries = {entry.get_id(): entry
+               for entry in AppQuery._scan_desktop_files()}
+    assert set(entries) == INSTALLED_IDS
+    assert entries["shadowed.desktop"].get_display_name() == "User Version"
+    assert entries["firefox.desktop"].get_executable() == "firefox"
+    assert entries["firefox.desktop"].get_keywords() == ["Internet", "WWW"]
+
+
+def test_basic_matching(catalog):
+    assert catalog.query("editor") == ["gimp.desktop", "gedit.desktop"]
+    assert catalog.query("ECRAN") == ["ecran.desktop"]
+    assert catalog.query("") == catalog.get_app_ids()
+
+
+def test_basic_matching_searches_other_fields(catalog):
+    assert catalog.query("notepad") == ["gedit.desktop"]
+    assert catalog.query("webbrowser") == ["firefox.desktop"]
+    assert catalog.query("konsole") == ["kde-konsole.desktop"]
+
+
+def test_regex_matching(catalog):
+    assert catalog.query("^(Text|Hex) ", use_regex=True) == \
+        ["hexview.desktop", "gedit.desktop"]
+    with pytest.raises(ValueError):
+        catalog.query("(", use_regex=True)
+
+
+def test_fuzzy_matching_ranks_best_first(catalog):
+    assert catalog.query("firfox", use_fuzzy=True)[0] == "firefox.desktop"
+    assert catalog.query("text", use_fuzzy=True)[0] == "gedit.desktop"
+    assert "gedit.desktop" in catalog.query("notepad", use_fuzzy=True)
+
+
+def test_fuzzy_matching_of_empty_normalized_term(catalog):
+    accent = "\u0301"
+    assert catalog.query(accent, use_fuzzy=True) == catalog.get_app_ids()
+    assert catalog.query_indices(accent, use_fuzzy=True, limit=2) == [0, 1]
+    assert catalog.fuzzy_search(accent, 3, {4, 1}) == [1, 4]
+    assert catalog.get_ranker(accent)(10) == []
+
+
+def test_limit_and_offset(catalog):
+    app_ids = catalog.query()
+    assert catalog.query(limit=2) == app_ids[:2]
+    assert catalog.query(limit=2, offset=3) == app_ids[3:5]
+    assert catalog.query(offset=len(app_ids)) == []
+    ranked = catalog.query("e", use_fuzzy=True)
+    assert catalog.query("e", use_fuzzy=True, limit=2, offset=1) == \
+        ranked[1:3]
+
+
+def test_mime_matching(catalog):
+    assert catalog.query(mime_types=["image/png"]) == ["gimp.desktop"]
+    assert catalog.query(mime_types=["image"]) == ["gimp.desktop"]
+    assert catalog.query("gnu", mime_types=["text/html"]) == []
+
+
+def test_mime_closure_excludes_octet_stream(catalog):
+    from gi.repository import Gio
+    if not Gio.content_type_is_a("text/x-python", "text/plain"):
+        pytest.skip("shared MIME database not installed")
+    assert catalog.query(mime_types=["text/x-python"]) == ["gedit.desktop"]
+    assert catalog.query(mime_types=["application/octet-stream"]) == \
+        ["hexview.desktop"]
+
+
+def test_prefix_search(catalog):
+    names = catalog.get_display_names()
+    assert [names[i] for i in catalog.prefix_search("te", 5)] == \
+        ["Text Editor"]
+    assert [names[i] for i in catalog.prefix_search("ed", 5)] == \
+        ["Text Editor"]
+    assert catalog.get_prefix_searcher()("WEB", 5) == \
+        catalog.prefix_search("web", 5)
+
+
+def test_snapshot_round_trip(catalog, tmp_path):
+    data = catalog._read_data()
+    path = str(tmp_path / "catalog.marshal")
+    data.save_snapshot(path, ("signature",))
+    loaded = AppQuery._CatalogData.load_snapshot(path, ("signature",))
+    for field in AppQuery._CatalogData._SNAPSHOT_FIELDS:
+        assert getattr(loaded, field) == getattr(data, field), field
+    assert loaded.name_keys == data.name_keys
+    assert loaded.fuzzy_search("editr", 5) == data.fuzzy_search("editr", 5)
+    assert loaded.get_app_info(0).get_id() == data.ids[0]
+    assert AppQuery._CatalogData.load_snapshot(path, ("stale",)) is None
+
+
+def test_catalog_loads_saved_snapshot(catalog):
+    path = AppQuery._get_snapshot_path()
+    if os.path.exists(path):
+        os.remove(path)
+    catalog.set_use_snapshot(True)
+    app_ids = catalog.query("e", use_fuzzy=True)
+    assert os.path.exists(path)
+
+    reloaded = AppCatalog()
+    reloaded.set_use_snapshot(True)
+    assert reloaded.query("e", use_fuzzy=True) == app_ids
+    assert reloaded._data.index_ms == 0  # Read from the snapshot, not built
+
+
+def test_usage_is_saved_and_ranks_apps(tmp_path):
+    path = str(tmp_path / "usage" / "usage.log")
+    usage = AppUsage(path)
+    usage.record("gimp.desktop")
+    usage.record("gedit.desktop")
+    usage.record("gedit.desktop")
+    usage.record(None)
+    assert usage.get_score("firefox.desktop") is None
+
+    reloaded = AppUsage(path)
+    assert reloaded.get_scores() == usage.get_scores()
+    assert set(reloaded.get_scores()) == {"gedit.desktop", "gimp.desktop"}
+    assert reloaded.get_score("gedit.desktop") > \
+        reloaded.get_score("gimp.desktop")
+
+
+def test_usage_log_is_compacted(tmp_path):
+    path = str(tmp_path / "usage.log")
+    usage = AppUsage(path)
+    for _ in range(100):
+        usage.record("gedit.desktop")
+    score = usage.get_score("gedit.desktop")
+
+    reloaded = AppUsage(path)
+    assert reloaded.get_score("gedit.desktop") == pytest.approx(score)
+    with open(path, encoding="utf-8") as usage_file:
+        assert len(usage_file.readlines()) == 1
+
+
+def test_frecency_lists_used_apps_first(catalog, monkeypatch, tmp_path):
+    usage = AppUsage(str(tmp_path / "usage.log"))
+    usage.record("hexview.desktop")
+    usage.record("gedit.desktop")
+    usage.record("gedit.desktop")
+    monkeypatch.setattr(AppUsage, "_default", usage)
+    app_ids = catalog.query(use_frecency=True)
+    assert app_ids[:2] == ["gedit.desktop", "hexview.desktop"]
+    assert set(app_ids) == INSTALLED_IDS
+    assert catalog.query("view", use_frecency=True) == ["hexview.desktop"]